@@ -66,6 +66,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "bood_app.middleware.CacheInvalidationMiddleware",
 ]
 
 ROOT_URLCONF = "bood.urls"
@@ -234,6 +235,7 @@ CACHES = {
         "LOCATION": "redis://redis:6379",
         "OPTIONS": {
             "db": "1",
+            "serializer": "bood_app.utils.cache_serializer.CompressedRedisSerializer",
         },
     }
 }
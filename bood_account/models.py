@@ -42,6 +42,8 @@ class Person(AbstractBaseUser):
     is_verified = models.BooleanField(("Подтвержден"), default=False)
 
     objects = UserManager()
+    # Владельцем кеша пользователя является он сам
+    cache_owner_lookups = ("id",)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["name"]
@@ -12,6 +12,7 @@ from .models import (
     ProductCategory,
     Water,
     FAQ,
+    DailyIntake,
 )
 
 
@@ -116,12 +117,20 @@ class ProductWeightInline(admin.TabularInline):
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ("id", "title", "description", "person_card", "is_active")
+    list_display = ("id", "title", "description", "person_card", "calories", "weight", "is_active")
     list_display_links = ("title",)
+    readonly_fields = ("calories", "proteins", "fats", "carbohydrates", "water", "weight")
     inlines = [ProductWeightInline]
     list_per_page = 20
 
 
+class DailyIntakeAdmin(admin.ModelAdmin):
+    list_display = ("id", "person_card", "date", "calories", "proteins", "fats", "carbohydrates", "water")
+    list_filter = ("date",)
+    search_fields = ("person_card__person__email",)
+    list_per_page = 20
+
+
 admin.site.register(Vitamin, VitaminAdmin)
 admin.site.register(MicroElement, MicroElementAdmin)
 admin.site.register(ProductWeight)
@@ -134,3 +143,4 @@ admin.site.register(PersonCard, PersonCardAdmin)
 admin.site.register(FemaleType)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(FAQ)
+admin.site.register(DailyIntake, DailyIntakeAdmin)
@@ -2,12 +2,30 @@ from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 
 from bood_app.serializers import (
+    BulkEatingSerializer,
     CalculateSerializer,
+    CalculateRangeSerializer,
     RecommendationIncludeSerializer,
     RecommendationExcludeSerializer,
     ProductSearchSerializer,
 )
 
+dynamic_fields_parameters = [
+    OpenApiParameter(
+        "fields",
+        OpenApiTypes.STR,
+        OpenApiParameter.QUERY,
+        description="Поля ответа через запятую, по умолчанию все",
+    ),
+    OpenApiParameter(
+        "expand",
+        OpenApiTypes.STR,
+        OpenApiParameter.QUERY,
+        description="Раскрываемые вложенные объекты через запятую, вложенные - через точку "
+        "(recipe.product_weight). Нераскрытые выводятся как id. Без параметра раскрываются все",
+    ),
+]
+
 product_list_summary = extend_schema_view(
     list=extend_schema(summary="Получение списка продуктов (есть фильтрация)", description="Поиск по названию продукта")
 )
@@ -32,7 +50,7 @@ faq_list_summary = extend_schema_view(
 )
 
 person_card_summary = extend_schema_view(
-    list=extend_schema(summary="Получить свою карточку"),
+    list=extend_schema(summary="Получить свою карточку", parameters=dynamic_fields_parameters),
     partial_update=extend_schema(summary="Изменение карточки пользователя по id карточки"),
     create=extend_schema(summary="Создание карточки пользователя"),
     destroy=extend_schema(summary="Удаление карточки пользователя по id карточки"),
@@ -51,8 +69,8 @@ measurement_summary = extend_schema_view(
 )
 
 recipe_summary = extend_schema_view(
-    list=extend_schema(summary="Получить свой список рецептов"),
-    retrieve=extend_schema(summary="Получить свой рецепт по ID"),
+    list=extend_schema(summary="Получить свой список рецептов", parameters=dynamic_fields_parameters),
+    retrieve=extend_schema(summary="Получить свой рецепт по ID", parameters=dynamic_fields_parameters),
     create=extend_schema(summary="Создание нового рецепта"),
     partial_update=extend_schema(summary="Частичное изменение рецепта по ID"),
     destroy=extend_schema(summary="Удаление рецепта по ID"),
@@ -60,11 +78,14 @@ recipe_summary = extend_schema_view(
 
 eating_summary = extend_schema_view(
     list=extend_schema(
-        summary="Получение списка приемов пищи пользователя", description="Получить список приемов пищи пользователя"
+        summary="Получение списка приемов пищи пользователя",
+        description="Получить список приемов пищи пользователя",
+        parameters=dynamic_fields_parameters,
     ),
     retrieve=extend_schema(
         summary="Получить информацию о приеме пищи по ID",
         description="Получить подробную информацию о конкретном приеме пищи по его ID",
+        parameters=dynamic_fields_parameters,
     ),
     create=extend_schema(
         summary="Создание нового приема пищи", description="Создать новую запись о приеме пищи для пользователя"
@@ -76,6 +97,13 @@ eating_summary = extend_schema_view(
     destroy=extend_schema(
         summary="Удаление приема пищи по ID", description="Удалить информацию о приеме пищи по его ID"
     ),
+    bulk=extend_schema(
+        summary="Пакетное создание приемов пищи",
+        description="Создать до 100 приемов пищи одним запросом, например после работы без сети. "
+        "Все записи создаются в одной транзакции, ошибки возвращаются по каждому элементу",
+        request=BulkEatingSerializer(many=True),
+        responses=BulkEatingSerializer(many=True),
+    ),
 )
 
 calculate_current_retrieve_summary = extend_schema(
@@ -87,6 +115,18 @@ calculate_current_retrieve_summary = extend_schema(
     responses=CalculateSerializer,
 )
 
+calculate_current_range_retrieve_summary = extend_schema(
+    parameters=[
+        OpenApiParameter("from", OpenApiTypes.DATE, OpenApiParameter.QUERY),
+        OpenApiParameter("to", OpenApiTypes.DATE, OpenApiParameter.QUERY),
+    ],
+    summary="Получение текущих и нормативных КБЖУ пользователя по дням за период",
+    description="Получение текущих и нормативных КБЖУ пользователя по дням за период (не более 366 дней)."
+    "Если дата не передана, используется текущая дата",
+    request=None,
+    responses=CalculateRangeSerializer,
+)
+
 calculate_standard_retrieve_summary = extend_schema(
     parameters=[OpenApiParameter("date", OpenApiTypes.DATE, OpenApiParameter.QUERY)],
     summary="Получение нормативных КБЖУ пользователя на определенную дату",
@@ -111,3 +151,18 @@ recommendation_exclude_summary = extend_schema(
     request=None,
     responses=RecommendationExcludeSerializer,
 )
+
+cache_metrics_summary = extend_schema(
+    summary="Метрики кеша текущего процесса",
+    description="Счетчики попаданий, промахов, записей и инвалидаций, гистограммы задержек и размеров значений "
+    "по префиксам кеша. Доступно только администраторам",
+    request=None,
+    responses=OpenApiTypes.OBJECT,
+)
+
+cache_metrics_prometheus_summary = extend_schema(
+    summary="Метрики кеша текущего процесса в формате Prometheus",
+    description="Доступно только администраторам",
+    request=None,
+    responses={(200, "text/plain"): OpenApiTypes.STR},
+)
@@ -7,4 +7,6 @@ class BoodAppConfig(AppConfig):
     verbose_name = "КБЖУ"
 
     def ready(self) -> None:
+        # Представления регистрируют зависимости кеша, по которым подключаются сигналы
+        import bood_app.views
         import bood_app.signals
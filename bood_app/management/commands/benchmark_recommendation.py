@@ -0,0 +1,45 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from bood_app.models import PersonCard
+from bood_app.services.recommendation import RecommendationService
+
+
+class Command(BaseCommand):
+    help = "Замер числа запросов и времени подбора рекомендаций для карточки пользователя"
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("person_card", type=int, help="Id карточки пользователя")
+        parser.add_argument("--date", type=str, help="Дата в формате YYYY-MM-DD, по умолчанию сегодня")
+        parser.add_argument("--repeat", type=int, default=20, help="Количество повторов")
+
+    def handle(self, *args, **options) -> None:
+        person_card = PersonCard.objects.filter(pk=options["person_card"]).first()
+        if person_card is None:
+            raise CommandError("Карточка пользователя не найдена")
+        date = datetime.date.fromisoformat(options["date"]) if options["date"] else timezone.now().date()
+
+        for title, method in (("include", "get_include_products"), ("exclude", "get_exclude_product")):
+            queries = []
+            durations = []
+            for _ in range(options["repeat"]):
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    try:
+                        getattr(RecommendationService(person_card, date), method)()
+                    except ValidationError as error:
+                        raise CommandError(str(error.detail)) from error
+                    durations.append(time.perf_counter() - start)
+                queries.append(len(context))
+            durations.sort()
+            self.stdout.write(
+                f"{title}: запросов {max(queries)}, "
+                f"медиана {durations[len(durations) // 2] * 1000:.2f} мс, "
+                f"максимум {durations[-1] * 1000:.2f} мс"
+            )
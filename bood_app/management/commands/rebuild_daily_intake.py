@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models.functions import TruncDate
+
+from bood_app.models import DailyIntake, Eating
+from bood_app.services.calculate import NUTRIENTS, get_eaten_nutrients
+
+
+class Command(BaseCommand):
+    help = "Пересчет или проверка сводок КБЖУ за день по исходным приемам пищи"
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("--verify", action="store_true", help="Только проверить сводки, ничего не изменяя")
+        parser.add_argument("--person-card", type=int, help="Обработать только указанную карточку пользователя")
+
+    def handle(self, *args, **options) -> None:
+        eatings = Eating.objects.all()
+        daily_intakes = DailyIntake.objects.all()
+        if options["person_card"]:
+            eatings = eatings.filter(person_card_id=options["person_card"])
+            daily_intakes = daily_intakes.filter(person_card_id=options["person_card"])
+
+        days = set(
+            eatings.annotate(day=TruncDate("datetime_add")).values_list("person_card_id", "day").distinct().order_by()
+        )
+        stored = {(row.person_card_id, row.date): row for row in daily_intakes}
+
+        drifted = []
+        for person_card_id, day in sorted(days | set(stored)):
+            nutrients = get_eaten_nutrients(person_card_id, day)
+            row = stored.get((person_card_id, day))
+            if row is None or any(abs(getattr(row, n) - nutrients[n]) > 1e-6 for n in NUTRIENTS):
+                drifted.append((person_card_id, day, nutrients))
+
+        if options["verify"]:
+            for person_card_id, day, _ in drifted:
+                self.stdout.write(f"Сводка не совпадает: карточка {person_card_id}, дата {day}")
+            if drifted:
+                raise CommandError(f"Найдено расхождений: {len(drifted)}")
+            self.stdout.write(self.style.SUCCESS("Сводки совпадают с приемами пищи"))
+            return
+
+        with transaction.atomic():
+            for person_card_id, day, nutrients in drifted:
+                DailyIntake.objects.update_or_create(person_card_id=person_card_id, date=day, defaults=nutrients)
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано сводок: {len(drifted)}"))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from bood_app.models import Recipe
+from bood_app.services.calculate import RECIPE_TOTALS, get_recipe_totals, refresh_recipe_nutrients
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Заполнение или проверка сохраненных сумм КБЖУ рецептов по их продуктам"
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("--verify", action="store_true", help="Только проверить суммы, ничего не изменяя")
+        parser.add_argument("--person-card", type=int, help="Обработать только рецепты указанной карточки")
+
+    def handle(self, *args, **options) -> None:
+        recipes = Recipe.objects.all()
+        if options["person_card"]:
+            recipes = recipes.filter(person_card_id=options["person_card"])
+
+        totals = get_recipe_totals(recipes)
+
+        drifted = []
+        for recipe in recipes.order_by("id").values("id", *RECIPE_TOTALS):
+            row = totals.get(recipe["id"], {})
+            if any(abs(recipe[field] - (row.get(field) or 0)) > 1e-6 for field in RECIPE_TOTALS):
+                drifted.append(recipe["id"])
+
+        if options["verify"]:
+            for recipe_id in drifted:
+                self.stdout.write(f"Суммы не совпадают: рецепт {recipe_id}")
+            if drifted:
+                raise CommandError(f"Найдено расхождений: {len(drifted)}")
+            self.stdout.write(self.style.SUCCESS("Суммы рецептов совпадают с продуктами"))
+            return
+
+        with transaction.atomic():
+            for start in range(0, len(drifted), BATCH_SIZE):
+                refresh_recipe_nutrients(drifted[start : start + BATCH_SIZE])
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано рецептов: {len(drifted)}"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from bood_app.views import FAQViewSet, FemaleTypeViewSet, ProductCategoryViewSet, ProductViewSet
+
+REFERENCE_VIEWS = (ProductViewSet, ProductCategoryViewSet, FAQViewSet, FemaleTypeViewSet)
+
+
+class Command(BaseCommand):
+    help = "Заполнение общего кеша справочников, например после импорта продуктов"
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument("--pages", type=int, default=10, help="Количество первых страниц каждого справочника")
+
+    def handle(self, *args, **options) -> None:
+        for view_class in REFERENCE_VIEWS:
+            pages = view_class.warm_reference_cache(options["pages"])
+            self.stdout.write(f"{view_class.reference_table}: страниц {pages}")
+        self.stdout.write(self.style.SUCCESS("Кеш справочников заполнен"))
@@ -0,0 +1,17 @@
+from bood_app.utils.cache import finish_cache_invalidation_batch, start_cache_invalidation_batch
+
+
+class CacheInvalidationMiddleware:
+    """
+    Сбор инвалидаций кеша за время запроса и их запись одним обращением к кешу после ответа.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start_cache_invalidation_batch()
+        try:
+            return self.get_response(request)
+        finally:
+            finish_cache_invalidation_batch()
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-17 19:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bood_app", "0005_alter_personcard_target"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyIntake",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField(verbose_name="Дата")),
+                ("calories", models.FloatField(default=0.0, verbose_name="Калории")),
+                ("proteins", models.FloatField(default=0.0, verbose_name="Белки")),
+                ("fats", models.FloatField(default=0.0, verbose_name="Жиры")),
+                ("carbohydrates", models.FloatField(default=0.0, verbose_name="Углеводы")),
+                ("water", models.FloatField(default=0.0, verbose_name="Вода")),
+                (
+                    "person_card",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_intake",
+                        to="bood_app.personcard",
+                        verbose_name="Карточка пользователя",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Сводка за день",
+                "verbose_name_plural": "Сводки за день",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="dailyintake",
+            constraint=models.UniqueConstraint(fields=("person_card", "date"), name="unique_daily_intake"),
+        ),
+    ]
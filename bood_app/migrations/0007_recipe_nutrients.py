@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:05
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, Sum
+
+NUTRIENTS = ("calories", "proteins", "fats", "carbohydrates", "water")
+
+
+def fill_recipe_nutrients(apps, schema_editor):
+    Recipe = apps.get_model("bood_app", "Recipe")
+    ProductWeight = apps.get_model("bood_app", "ProductWeight")
+    rows = (
+        ProductWeight.objects.filter(recipe__isnull=False)
+        .values("recipe_id")
+        .annotate(
+            total_weight=Sum("weight"),
+            **{
+                nutrient: Sum(F(f"product__{nutrient}") * F("weight"), output_field=FloatField())
+                for nutrient in NUTRIENTS
+            },
+        )
+        .order_by()
+    )
+    recipes = []
+    for row in rows:
+        recipe = Recipe(pk=row["recipe_id"], weight=row["total_weight"] or 0)
+        for nutrient in NUTRIENTS:
+            setattr(recipe, nutrient, row[nutrient] or 0.0)
+        recipes.append(recipe)
+    Recipe.objects.bulk_update(recipes, NUTRIENTS + ("weight",), batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bood_app", "0006_dailyintake"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="calories",
+            field=models.FloatField(default=0.0, verbose_name="Калории"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="proteins",
+            field=models.FloatField(default=0.0, verbose_name="Белки"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="fats",
+            field=models.FloatField(default=0.0, verbose_name="Жиры"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="carbohydrates",
+            field=models.FloatField(default=0.0, verbose_name="Углеводы"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="water",
+            field=models.FloatField(default=0.0, verbose_name="Вода"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="weight",
+            field=models.PositiveIntegerField(default=0, verbose_name="Вес"),
+        ),
+        migrations.RunPython(fill_recipe_nutrients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("bood_app", "0007_recipe_nutrients"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="eating",
+            index=models.Index(fields=["person_card", "-datetime_add", "-id"], name="eating_timeline_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="measurement",
+            index=models.Index(fields=["person_card", "-datetime_add", "-id"], name="measurement_timeline_idx"),
+        ),
+    ]
@@ -1,10 +1,70 @@
+from typing import Union
+
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 
 from bood_account.models import Person
-from bood_app.utils.cache import delete_model_cache_for_current_user
+from bood_app.utils.cache import LocalCache
+from bood_app.utils.cache_dependencies import bump_dependent_cache_generations
 from bood_app.utils.models.resources import GENDER_TYPE, TARGET_TYPE, ACTIVITY_TYPE
 
+person_card_owners = LocalCache(10000, 60 * 60 * 1)
+
+
+def get_person_id(person_card_id: int) -> Union[int, None]:
+    """
+    Id пользователя по id карточки.
+    Владелец карточки не меняется, поэтому значение запоминается в памяти процесса.
+    """
+    person_id = person_card_owners.get(person_card_id)
+    if person_id is None:
+        person_id = PersonCard.objects.filter(pk=person_card_id).values_list("person_id", flat=True).first()
+        if person_id is not None:
+            person_card_owners.set(person_card_id, person_id)
+    return person_id
+
+
+class CacheOwnerQuerySet(models.QuerySet):
+    """
+    QuerySet моделей, от которых зависит кеш пользователей.
+    Массовое обновление сбрасывает кеш владельцев обновленных записей.
+    """
+
+    def get_cache_owner_ids(self, lookups: Union[tuple, None] = None) -> set:
+        person_ids = set()
+        for lookup in lookups or self.model.cache_owner_lookups:
+            person_ids.update(self.order_by().values_list(lookup, flat=True).distinct())
+        person_ids.discard(None)
+        return person_ids
+
+    def update(self, **kwargs) -> int:
+        person_ids = self.get_cache_owner_ids()
+        rows = super().update(**kwargs)
+        bump_dependent_cache_generations(self.model, person_ids)
+        return rows
+
+
+def get_cache_owner_ids(instance: models.Model) -> set:
+    """
+    Id пользователей, чей кеш зависит от записи.
+    Владелец через карточку берется из памяти процесса, остальные пути запрашиваются одним запросом на путь.
+    """
+    person_ids = set()
+    lookups = []
+    for lookup in type(instance).cache_owner_lookups:
+        if lookup == "id":
+            person_ids.add(instance.pk)
+        elif lookup == "person_id":
+            person_ids.add(instance.person_id)
+        elif lookup == "person_card__person_id":
+            person_ids.add(get_person_id(instance.person_card_id))
+        else:
+            lookups.append(lookup)
+    if lookups and instance.pk is not None:
+        person_ids.update(type(instance).objects.filter(pk=instance.pk).get_cache_owner_ids(tuple(lookups)))
+    person_ids.discard(None)
+    return person_ids
+
 
 class PersonCard(models.Model):
     height = models.PositiveSmallIntegerField(
@@ -29,16 +89,13 @@ class PersonCard(models.Model):
         verbose_name="Исключенные категории продуктов",
     )
 
+    objects = CacheOwnerQuerySet.as_manager()
+    cache_owner_lookups = ("person_id",)
+
     class Meta:
         verbose_name = "Карточка пользователя"
         verbose_name_plural = "Карточки пользователей"
 
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        delete_model_cache_for_current_user("person_card", self.person.id)
-        delete_model_cache_for_current_user("calculate_standard", self.person.id)
-        delete_model_cache_for_current_user("calculate_current", self.person.id)
-        return super().save()
-
     def __str__(self) -> str:
         return str(self.person.email)
 
@@ -69,15 +126,13 @@ class Measurement(models.Model):
         "PersonCard", on_delete=models.CASCADE, related_name="measurements", verbose_name="Карточка пользователя"
     )
 
+    objects = CacheOwnerQuerySet.as_manager()
+    cache_owner_lookups = ("person_card__person_id",)
+
     class Meta:
         verbose_name = "Замер"
         verbose_name_plural = "Замеры"
-
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        delete_model_cache_for_current_user("measurement", self.person_card.person.id)
-        delete_model_cache_for_current_user("calculate_standard", self.person_card.person.id)
-        delete_model_cache_for_current_user("calculate_current", self.person_card.person.id)
-        return super().save()
+        indexes = [models.Index(fields=["person_card", "-datetime_add", "-id"], name="measurement_timeline_idx")]
 
     def __str__(self) -> str:
         return str(self.person_card.person.email)
@@ -125,6 +180,8 @@ class Product(models.Model):
         "MicroElement", on_delete=models.CASCADE, null=True, related_name="product", verbose_name="Микроэлементы"
     )
 
+    nutrient_fields = ("calories", "proteins", "fats", "carbohydrates", "water")
+
     class Meta:
         verbose_name = "Продукт"
         verbose_name_plural = "Продукты"
@@ -132,6 +189,26 @@ class Product(models.Model):
     def __str__(self) -> str:
         return str(self.title)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.saved_nutrients = instance.get_nutrients()
+        return instance
+
+    def get_nutrients(self) -> dict:
+        """
+        Загруженные значения КБЖУ и воды. Отложенные поля не запрашиваются.
+        """
+        return {name: self.__dict__[name] for name in self.nutrient_fields if name in self.__dict__}
+
+    def has_changed_nutrients(self) -> bool:
+        """
+        Изменились ли КБЖУ и вода после загрузки из БД или последнего сохранения.
+        Если прежние значения неизвестны, считается, что изменились.
+        """
+        saved = getattr(self, "saved_nutrients", None)
+        return saved is None or self.get_nutrients() != saved
+
 
 class Vitamin(models.Model):
     a = models.FloatField(
@@ -219,13 +296,13 @@ class Eating(models.Model):
         "PersonCard", on_delete=models.CASCADE, related_name="eating", verbose_name="Карточка пользователя"
     )
 
+    objects = CacheOwnerQuerySet.as_manager()
+    cache_owner_lookups = ("person_card__person_id",)
+
     class Meta:
         verbose_name = "Прием пищи"
         verbose_name_plural = "Приемы пищи"
-
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        delete_model_cache_for_current_user("eating", self.person_card.person.id)
-        return super().save()
+        indexes = [models.Index(fields=["person_card", "-datetime_add", "-id"], name="eating_timeline_idx")]
 
     def __str__(self) -> str:
         return str(self.person_card.person.email)
@@ -252,18 +329,13 @@ class ProductWeight(models.Model):
         "Recipe", on_delete=models.CASCADE, related_name="product_weight", null=True, blank=True, verbose_name="Рецепт"
     )
 
+    objects = CacheOwnerQuerySet.as_manager()
+    cache_owner_lookups = ("eating__person_card__person_id", "recipe__person_card__person_id")
+
     class Meta:
         verbose_name = "Продукт с весом"
         verbose_name_plural = "Продукты с весом"
 
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        eating = Eating.objects.filter(product_weight=self.id).first()
-        if eating:
-            delete_model_cache_for_current_user("eating", eating.person_card.person.id)
-        if self.recipe:
-            delete_model_cache_for_current_user("recipe", self.recipe.person_card.person.id)
-        return super().save()
-
     def __str__(self) -> str:
         return str(self.product.title)
 
@@ -276,15 +348,20 @@ class Recipe(models.Model):
     )
     image = models.URLField(blank=True, default="", verbose_name="Изображение")
     is_active = models.BooleanField(default=True, verbose_name="Активен")
+    calories = models.FloatField(default=0.0, verbose_name="Калории")
+    proteins = models.FloatField(default=0.0, verbose_name="Белки")
+    fats = models.FloatField(default=0.0, verbose_name="Жиры")
+    carbohydrates = models.FloatField(default=0.0, verbose_name="Углеводы")
+    water = models.FloatField(default=0.0, verbose_name="Вода")
+    weight = models.PositiveIntegerField(default=0, verbose_name="Вес")
+
+    objects = CacheOwnerQuerySet.as_manager()
+    cache_owner_lookups = ("person_card__person_id",)
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
 
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        delete_model_cache_for_current_user("recipe", self.person_card.person.id)
-        return super().save()
-
     def __str__(self) -> str:
         return str(self.title)
 
@@ -292,15 +369,35 @@ class Recipe(models.Model):
 class Water(models.Model):
     weight = models.PositiveSmallIntegerField(validators=[MinValueValidator(1)], verbose_name="Объем")
 
+    objects = CacheOwnerQuerySet.as_manager()
+    cache_owner_lookups = ("eating__person_card__person_id",)
+
     class Meta:
         verbose_name = "Вода"
         verbose_name_plural = "Вода"
 
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        eating = Eating.objects.filter(water=self.id).first()
-        if eating:
-            delete_model_cache_for_current_user("eating", eating.person_card.person.id)
-        return super().save()
-
     def __str__(self) -> str:
         return str(self.weight)
+
+
+class DailyIntake(models.Model):
+    date = models.DateField(verbose_name="Дата")
+    calories = models.FloatField(default=0.0, verbose_name="Калории")
+    proteins = models.FloatField(default=0.0, verbose_name="Белки")
+    fats = models.FloatField(default=0.0, verbose_name="Жиры")
+    carbohydrates = models.FloatField(default=0.0, verbose_name="Углеводы")
+    water = models.FloatField(default=0.0, verbose_name="Вода")
+    person_card = models.ForeignKey(
+        "PersonCard", on_delete=models.CASCADE, related_name="daily_intake", verbose_name="Карточка пользователя"
+    )
+
+    objects = CacheOwnerQuerySet.as_manager()
+    cache_owner_lookups = ("person_card__person_id",)
+
+    class Meta:
+        verbose_name = "Сводка за день"
+        verbose_name_plural = "Сводки за день"
+        constraints = [models.UniqueConstraint(fields=["person_card", "date"], name="unique_daily_intake")]
+
+    def __str__(self) -> str:
+        return f"{self.person_card_id}: {self.date}"
@@ -0,0 +1,54 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.settings import api_settings
+
+# Курсорный режим: новые записи первыми, id различает записи с одинаковым временем
+TIMELINE_ORDERING = ("-datetime_add", "-id")
+# Режим limit/offset сохраняет прежний порядок списков: от старых записей к новым
+OFFSET_ORDERING = ("datetime_add", "id")
+
+
+class TimelineCursorPagination(CursorPagination):
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "limit"
+    ordering = TIMELINE_ORDERING
+
+
+class TimelinePagination(LimitOffsetPagination):
+    """
+    Пагинация истории пользователя.
+    По умолчанию limit/offset, как у остальных списков, в порядке (datetime_add, id). С параметром cursor
+    (пустой - первая страница) используется курсорная пагинация от новых записей к старым, порядок
+    (-datetime_add, -id): без COUNT и без пропуска строк отступа, ссылки next и previous продолжают курсорный режим.
+    Оба порядка обслуживает один индекс (person_card, -datetime_add, -id).
+    """
+
+    cursor_query_param = "cursor"
+    cursor_description = "Курсор страницы. Пустое значение - первая страница в курсорном режиме, без count."
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = TimelineCursorPagination()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset.order_by(*OFFSET_ORDERING), request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append(
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": self.cursor_description,
+                "schema": {"type": "string"},
+            }
+        )
+        return parameters
@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.db.models import Prefetch
 from django.utils import timezone
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_field
@@ -16,12 +18,19 @@ from .models import (
     ProductCategory,
     FAQ,
 )
-from .services.calculate import CalculateService
-from .services.recommendation import RecommendationService
-from bood_app.utils.serializers.calculate_date_validation import check_dateformat_or_get_current_date
+from .services.calculate import CalculateService, get_current_range, get_recipe_nutrients, refresh_daily_intake
+from .services.recommendation import RecommendationService, get_products_by_ids
+from bood_app.utils.cache_dependencies import bump_dependent_cache_generations
+from bood_app.utils.serializers.calculate_date_validation import check_dateformat_or_get_current_date, check_date_range
+from bood_app.utils.serializers.dynamic_fields import (
+    DynamicFieldsMixin,
+    get_nested_expand,
+    is_field_expanded,
+    is_field_wanted,
+)
 from bood_app.utils.serializers.eating_validation import eating_validation
 from bood_app.utils.serializers.person_card_validation import get_person_card
-from .utils.serializers.product_weight_create import create_product_weight_instances
+from .utils.serializers.product_weight_create import create_product_weight_instances, update_product_weight_instances
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -154,12 +163,45 @@ class PostPersonCardSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class GetPersonCardSerializer(PostPersonCardSerializer):
+class GetPersonCardSerializer(DynamicFieldsMixin, PostPersonCardSerializer):
     femaletype = FemaleTypeSerializer(many=True)
     exclude_products = ProductSerializer(many=True)
     exclude_category = ProductCategorySerializer(many=True)
     person = PersonCreateSerializer()
 
+    collapsed_fields = {
+        "femaletype": lambda: serializers.PrimaryKeyRelatedField(many=True, read_only=True),
+        "exclude_products": lambda: serializers.PrimaryKeyRelatedField(many=True, read_only=True),
+        "exclude_category": lambda: serializers.PrimaryKeyRelatedField(many=True, read_only=True),
+        "person": lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        "measurements": lambda: serializers.PrimaryKeyRelatedField(many=True, read_only=True),
+    }
+
+    @staticmethod
+    def setup_eager_loading(queryset, fields=None, expand=None):
+        """
+        Загрузка вложенных объектов постоянным числом запросов.
+        Загружаются только запрошенные поля, для свернутых связей - только id.
+        """
+        if is_field_wanted(fields, "person") and is_field_expanded(expand, "person"):
+            queryset = queryset.select_related("person")
+        related = {
+            "femaletype": FemaleType,
+            "exclude_products": Product,
+            "exclude_category": ProductCategory,
+            "measurements": Measurement,
+        }
+        for name, model in related.items():
+            if not is_field_wanted(fields, name):
+                continue
+            if is_field_expanded(expand, name):
+                queryset = queryset.prefetch_related(name)
+            elif model is Measurement:
+                queryset = queryset.prefetch_related(Prefetch(name, queryset=model.objects.only("id", "person_card")))
+            else:
+                queryset = queryset.prefetch_related(Prefetch(name, queryset=model.objects.only("id")))
+        return queryset
+
 
 class ProductWeightSerializer(serializers.ModelSerializer):
     class Meta:
@@ -181,8 +223,32 @@ class PostRecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ("id", "title", "description", "person_card", "image", "is_active", "product_weight")
-        read_only_fields = ("id", "person_card", "is_active")
+        fields = (
+            "id",
+            "title",
+            "description",
+            "person_card",
+            "image",
+            "is_active",
+            "product_weight",
+            "calories",
+            "proteins",
+            "fats",
+            "carbohydrates",
+            "water",
+            "weight",
+        )
+        read_only_fields = (
+            "id",
+            "person_card",
+            "is_active",
+            "calories",
+            "proteins",
+            "fats",
+            "carbohydrates",
+            "water",
+            "weight",
+        )
 
     def create(self, validated_data):
         product_weight = validated_data.pop("product_weight")
@@ -191,31 +257,69 @@ class PostRecipeSerializer(serializers.ModelSerializer):
 
         user_id = self.context["user_id"]
         person_card = get_person_card(user_id)
-        recipe = Recipe.objects.create(person_card=person_card, **validated_data)
-        recipe.save()
-
-        create_product_weight_instances(product_weight, recipe)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(
+                person_card=person_card, **validated_data, **get_recipe_nutrients(product_weight)
+            )
+            create_product_weight_instances(product_weight, recipe)
         return recipe
 
     def update(self, instance, validated_data):
-        instance.is_active = False
-        instance.save()
-        instance.pk = None
-        instance.is_active = True
-        instance.save()
-        product_weight = validated_data.pop("product_weight")
+        """
+        Рецепт, который уже есть в приемах пищи, не меняется: создается новая версия,
+        а старая становится неактивной. Иначе рецепт и его продукты меняются на месте.
+        Суммы КБЖУ рецепта пересчитываются только при изменении продуктов.
+        Строка рецепта блокируется до проверки приемов пищи: добавление приема с этим рецептом
+        ждет окончания транзакции, поэтому рецепт не изменится на месте после того, как его съели.
+        """
+        product_weight = validated_data.pop("product_weight", None)
+        if product_weight is not None and not product_weight:
+            raise serializers.ValidationError({"status": "400", "error": "Product not found"})
+        if product_weight is not None:
+            validated_data.update(get_recipe_nutrients(product_weight))
+
+        with transaction.atomic():
+            Recipe.objects.select_for_update().only("id").get(pk=instance.pk)
+            if Eating.objects.filter(recipe=instance).exists():
+                if product_weight is None:
+                    product_weight = list(instance.product_weight.order_by("id").values("product_id", "weight"))
+                Recipe.objects.filter(pk=instance.pk).update(is_active=False)
+                instance.pk = None
+                instance._state.adding = True
+                for attr, value in validated_data.items():
+                    setattr(instance, attr, value)
+                instance.save()
+                create_product_weight_instances(product_weight, instance)
+                return instance
+
+            if product_weight is not None:
+                update_product_weight_instances(product_weight, instance)
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
+        return instance
 
-        create_product_weight_instances(product_weight, instance)
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+class GetRecipeSerializer(DynamicFieldsMixin, PostRecipeSerializer):
+    product_weight = ProductWeightDetailSerializer(many=True)
 
-        return instance
+    collapsed_fields = {"product_weight": lambda: ProductWeightSerializer(many=True, read_only=True)}
 
+    @staticmethod
+    def get_product_weight_prefetch(lookup: str = "product_weight", expand=None) -> Prefetch:
+        queryset = ProductWeight.objects.all()
+        if is_field_expanded(expand, "product_weight"):
+            queryset = queryset.select_related("product")
+        return Prefetch(lookup, queryset=queryset)
 
-class GetRecipeSerializer(PostRecipeSerializer):
-    product_weight = ProductWeightDetailSerializer(many=True)
+    @staticmethod
+    def setup_eager_loading(queryset, fields=None, expand=None):
+        """
+        Загрузка вложенных объектов постоянным числом запросов
+        """
+        if not is_field_wanted(fields, "product_weight"):
+            return queryset
+        return queryset.prefetch_related(GetRecipeSerializer.get_product_weight_prefetch(expand=expand))
 
 
 class WaterSerializer(serializers.ModelSerializer):
@@ -248,11 +352,7 @@ class PostEatingSerializer(serializers.ModelSerializer):
         if water:
             water = Water.objects.create(**water)
 
-        eating = Eating.objects.create(
-            product_weight=product_weight, recipe=recipe, water=water, person_card=person_card
-        )
-        eating.save()
-        return eating
+        return Eating.objects.create(product_weight=product_weight, recipe=recipe, water=water, person_card=person_card)
 
     def update(self, instance, validated_data):
         product_weight_data = validated_data.get("product_weight", None)
@@ -281,10 +381,129 @@ class PostEatingSerializer(serializers.ModelSerializer):
         return instance
 
 
-class GetEatingSerializer(PostEatingSerializer):
+class GetEatingSerializer(DynamicFieldsMixin, PostEatingSerializer):
     recipe = GetRecipeSerializer()
     product_weight = ProductWeightDetailSerializer()
 
+    collapsed_fields = {
+        "recipe": lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        "product_weight": lambda: ProductWeightSerializer(read_only=True),
+    }
+
+    @staticmethod
+    def setup_eager_loading(queryset, fields=None, expand=None):
+        """
+        Загрузка вложенных объектов постоянным числом запросов.
+        Свернутый рецепт не загружается, у свернутого продукта с весом не загружается продукт.
+        """
+        related = []
+        if is_field_wanted(fields, "product_weight"):
+            expanded = is_field_expanded(expand, "product_weight")
+            related.append("product_weight__product" if expanded else "product_weight")
+        if is_field_wanted(fields, "water"):
+            related.append("water")
+        if is_field_wanted(fields, "recipe") and is_field_expanded(expand, "recipe"):
+            related.append("recipe")
+            queryset = queryset.prefetch_related(
+                GetRecipeSerializer.get_product_weight_prefetch(
+                    "recipe__product_weight", get_nested_expand(expand, "recipe")
+                )
+            )
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset
+
+
+EATING_BULK_MAX_ITEMS = 100
+
+
+def get_bulk_ids(values) -> set:
+    """
+    Id из сырых данных запроса, пригодные для выборки одним запросом
+    """
+    ids = set()
+    for value in values:
+        if isinstance(value, int) or isinstance(value, str) and value.isdigit():
+            ids.add(int(value))
+    return ids
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Поле id, берущее объекты из загруженных списочным сериализатором одним запросом.
+    Неизвестные id проверяются обычным способом.
+    """
+
+    def to_internal_value(self, data):
+        objects = self.context.get("bulk_objects", {}).get(self.queryset.model, {})
+        try:
+            return objects[int(data)]
+        except (KeyError, TypeError, ValueError):
+            return super().to_internal_value(data)
+
+
+class BulkEatingListSerializer(serializers.ListSerializer):
+    """
+    Пакетное создание приемов пищи в одной транзакции.
+    Связанные продукты и рецепты загружаются одним запросом на модель, кеш сбрасывается один раз.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            if len(data) > EATING_BULK_MAX_ITEMS:
+                raise ValidationError({"status": "400", "error": f"Max {EATING_BULK_MAX_ITEMS} items per request"})
+            items = [item for item in data if isinstance(item, dict)]
+            product_ids = get_bulk_ids(
+                (item.get("product_weight") or {}).get("product")
+                for item in items
+                if isinstance(item.get("product_weight"), dict)
+            )
+            recipe_ids = get_bulk_ids(item.get("recipe") for item in items)
+            self.context["bulk_objects"] = {
+                Product: Product.objects.in_bulk(product_ids),
+                Recipe: Recipe.objects.in_bulk(recipe_ids),
+            }
+        return super().to_internal_value(data)
+
+    def create(self, validated_data) -> list:
+        person_card = get_person_card(self.context["user_id"])
+        with transaction.atomic():
+            product_weights = ProductWeight.objects.bulk_create(
+                ProductWeight(**item["product_weight"]) for item in validated_data if item.get("product_weight")
+            )
+            waters = Water.objects.bulk_create(Water(**item["water"]) for item in validated_data if item.get("water"))
+            product_weights = iter(product_weights)
+            waters = iter(waters)
+            eatings = Eating.objects.bulk_create(
+                Eating(
+                    product_weight=next(product_weights) if item.get("product_weight") else None,
+                    recipe=item.get("recipe"),
+                    water=next(waters) if item.get("water") else None,
+                    person_card=person_card,
+                )
+                for item in validated_data
+            )
+            for date in {eating.datetime_add.date() for eating in eatings}:
+                refresh_daily_intake(person_card.id, date)
+            bump_dependent_cache_generations(Eating, {person_card.person_id})
+        return eatings
+
+
+class BulkProductWeightSerializer(ProductWeightSerializer):
+    product = BulkPrimaryKeyRelatedField(queryset=Product.objects.all())
+
+
+class BulkEatingSerializer(PostEatingSerializer):
+    product_weight = BulkProductWeightSerializer(required=False)
+    recipe = BulkPrimaryKeyRelatedField(queryset=Recipe.objects.all(), required=False, allow_null=True)
+
+    class Meta(PostEatingSerializer.Meta):
+        list_serializer_class = BulkEatingListSerializer
+
+    def validate(self, attrs):
+        eating_validation(attrs.get("product_weight"), attrs.get("recipe"), attrs.get("water"))
+        return attrs
+
 
 class CalculateSerializer(serializers.Serializer):
     imt_type = serializers.SerializerMethodField()
@@ -349,6 +568,36 @@ class CalculateSerializer(serializers.Serializer):
         return self.instance["water"]
 
 
+class NutrientsSerializer(serializers.Serializer):
+    calories = serializers.IntegerField()
+    proteins = serializers.IntegerField()
+    fats = serializers.IntegerField()
+    carbohydrates = serializers.IntegerField()
+    water = serializers.IntegerField()
+
+
+class CalculateDaySerializer(serializers.Serializer):
+    date = serializers.DateField()
+    current = NutrientsSerializer()
+    standard = NutrientsSerializer(allow_null=True)
+
+
+class CalculateRangeSerializer(serializers.Serializer):
+    days = serializers.SerializerMethodField()
+
+    def __init__(self, context=None, instance=None, *args, **kwargs):
+        super().__init__(instance, *args, **kwargs)
+        if context:
+            user_id = context["user_id"]
+            date_from, date_to = check_date_range(context["date_from"], context["date_to"])
+            person_card = get_person_card(user_id)
+            self.days = get_current_range(person_card, date_from, date_to)
+
+    @extend_schema_field(CalculateDaySerializer(many=True))
+    def get_days(self, obj):
+        return CalculateDaySerializer(self.days, many=True).data
+
+
 class RecommendationIncludeSerializer(serializers.Serializer):
     products = serializers.SerializerMethodField()
 
@@ -360,6 +609,10 @@ class RecommendationIncludeSerializer(serializers.Serializer):
             date = timezone.now().date()
             person = RecommendationService(person_card, date)
             self.recommendation = person.get_include_products()
+            if self.recommendation is not None:
+                self.instance = [product.id for product in self.recommendation]
+        else:
+            self.recommendation = get_products_by_ids(instance) if instance is not None else None
 
     @extend_schema_field(ProductSerializerWithCategory(many=True))
     def get_products(self, obj):
@@ -377,6 +630,10 @@ class RecommendationExcludeSerializer(serializers.Serializer):
             date = timezone.now().date()
             person = RecommendationService(person_card, date)
             self.recommendation = person.get_exclude_product()
+            self.instance = [self.recommendation.id]
+        else:
+            products = get_products_by_ids(instance) if instance is not None else []
+            self.recommendation = products[0] if products else None
 
     @extend_schema_field(ProductSerializerWithCategory)
     def get_product(self, obj):
@@ -1,8 +1,15 @@
-from django.db.models import Q
+from django.db.models import Q, F, Sum, FloatField, Value, Case, When, Exists, OuterRef
+from django.db.models.functions import Coalesce, TruncDate
 from rest_framework.exceptions import ValidationError
 
-from bood_app.models import PersonCard, Measurement, ProductWeight, Product, Water
+from bood_app.models import PersonCard, Measurement, ProductWeight, DailyIntake, Eating, Recipe
+from bood_app.services.product_catalog import NUTRIENTS, ProductCatalog
+from bood_app.utils.cache_dependencies import bump_dependent_cache_generations
 import datetime
+from typing import Iterable, Union
+
+RECIPE_TOTALS = NUTRIENTS + ("weight",)
+DAILY_INTAKE_BATCH_SIZE = 500
 
 
 def get_ideal_weight(gender: str, hand: float, height: float) -> float:
@@ -41,13 +48,250 @@ def get_measurements(person_card: PersonCard, date: datetime.date) -> Measuremen
     return measurements
 
 
+def get_recipe_eaten_same_day(recipe: str, person_card: str, datetime_add: str) -> Exists:
+    """
+    Рецепт, к которому относится продукт с весом, съеден тем же пользователем в тот же день.
+    Такой продукт учитывается в приемах рецепта, а не еще раз как отдельный прием.
+    """
+    return Exists(
+        Eating.objects.filter(
+            recipe_id=OuterRef(recipe),
+            person_card_id=OuterRef(person_card),
+            datetime_add__date=OuterRef(f"{datetime_add}__date"),
+        )
+    )
+
+
+def get_eaten_product_weights(person_card_id: int, date: datetime.date) -> list:
+    """
+    Пары (id продукта, вес) съеденных за день продуктов.
+    Продукты рецепта учитываются в каждом приеме рецепта, продукт с весом - в своем приеме,
+    если он не входит в рецепт, съеденный в тот же день.
+    """
+    eaten = ProductWeight.objects.filter(
+        ~get_recipe_eaten_same_day("recipe_id", "eating__person_card_id", "eating__datetime_add"),
+        eating__datetime_add__date=date,
+        eating__person_card_id=person_card_id,
+    )
+    in_recipes = ProductWeight.objects.filter(
+        recipe__eating__datetime_add__date=date, recipe__eating__person_card_id=person_card_id
+    )
+    return list(
+        eaten.values_list("product_id", "weight").union(in_recipes.values_list("product_id", "weight"), all=True)
+    )
+
+
+def get_recipe_nutrients(product_weight: list) -> dict:
+    """
+    Суммарные КБЖУ, вода и вес рецепта по проверенным данным продуктов с весом.
+    Пустые значения продуктов не учитываются, как в SUM.
+    """
+    result = dict.fromkeys(NUTRIENTS, 0.0)
+    for item in product_weight:
+        for nutrient in NUTRIENTS:
+            value = getattr(item["product"], nutrient)
+            if value is not None:
+                result[nutrient] += value * item["weight"]
+    result["weight"] = sum(item["weight"] for item in product_weight)
+    return result
+
+
+def get_recipe_totals(recipes) -> dict:
+    """
+    КБЖУ, вода и вес рецептов по их продуктам, посчитанные на стороне БД, по id рецепта.
+    Рецептов без продуктов в результате нет.
+    """
+    rows = (
+        ProductWeight.objects.filter(recipe__in=recipes)
+        .values("recipe_id")
+        .annotate(
+            total_weight=Sum("weight"),
+            **{
+                nutrient: Sum(F(f"product__{nutrient}") * F("weight"), output_field=FloatField())
+                for nutrient in NUTRIENTS
+            },
+        )
+        .order_by()
+    )
+    totals = {}
+    for row in rows:
+        row["weight"] = row.pop("total_weight")
+        totals[row.pop("recipe_id")] = row
+    return totals
+
+
+def refresh_recipe_nutrients(recipe_ids: Iterable[int]) -> int:
+    """
+    Пересчет сохраненных КБЖУ, воды и веса рецептов по их продуктам.
+    Возвращает число обновленных рецептов.
+    """
+    recipes = list(Recipe.objects.filter(pk__in=recipe_ids).only("id", *RECIPE_TOTALS))
+    if not recipes:
+        return 0
+    totals = get_recipe_totals(recipes)
+    for recipe in recipes:
+        row = totals.get(recipe.pk, {})
+        for field in RECIPE_TOTALS:
+            setattr(recipe, field, row.get(field) or 0)
+    Recipe.objects.bulk_update(recipes, RECIPE_TOTALS)
+    return len(recipes)
+
+
+def get_eating_nutrient(nutrient: str) -> Coalesce:
+    """
+    Значение показателя для одного приема пищи: продукт с весом, готовые суммы рецепта или объем воды.
+    Продукт рецепта, съеденного в тот же день, уже учтен в сумме рецепта.
+    """
+    product = Case(
+        When(
+            Q(product_weight__recipe__isnull=False)
+            & get_recipe_eaten_same_day("product_weight__recipe_id", "person_card_id", "datetime_add"),
+            then=Value(0.0),
+        ),
+        default=F(f"product_weight__product__{nutrient}") * F("product_weight__weight"),
+        output_field=FloatField(),
+    )
+    sources = [product, F(f"recipe__{nutrient}")]
+    if nutrient == "water":
+        sources.append(F("water__weight"))
+    return Coalesce(*sources, Value(0.0), output_field=FloatField())
+
+
+def get_eaten_nutrients(person_card_id: int, date: datetime.date, catalog: Union[ProductCatalog, None] = None) -> dict:
+    """
+    Суммарные КБЖУ и вода за день, посчитанные на стороне БД
+    или, если передан каталог продуктов, по его снимку в памяти.
+    Число запросов не зависит от количества съеденных продуктов,
+    прием рецепта учитывается одной строкой по его сохраненным суммам.
+    """
+    if catalog is not None:
+        products = catalog.sum_nutrients(get_eaten_product_weights(person_card_id, date))
+        water = Eating.objects.filter(datetime_add__date=date, person_card_id=person_card_id).aggregate(
+            weight=Coalesce(Sum("water__weight"), 0)
+        )
+        products["water"] += water["weight"]
+        return products
+    return Eating.objects.filter(datetime_add__date=date, person_card_id=person_card_id).aggregate(
+        **{
+            nutrient: Coalesce(Sum(get_eating_nutrient(nutrient)), Value(0.0), output_field=FloatField())
+            for nutrient in NUTRIENTS
+        }
+    )
+
+
+def get_eaten_nutrients_by_day(person_card_id: int, date_from: datetime.date, date_to: datetime.date) -> dict:
+    """
+    Суммарные КБЖУ и вода по дням за период, сгруппированные на стороне БД.
+    """
+    eatings = Eating.objects.filter(datetime_add__date__range=(date_from, date_to), person_card_id=person_card_id)
+    return {day: nutrients for (_, day), nutrients in get_eaten_nutrients_by_card_day(eatings).items()}
+
+
+def get_eaten_nutrients_by_card_day(eatings) -> dict:
+    """
+    Суммарные КБЖУ и вода приемов пищи eatings по паре (id карточки, дата) одним запросом.
+    """
+    rows = (
+        eatings.annotate(day=TruncDate("datetime_add"))
+        .values("person_card_id", "day")
+        .annotate(**{nutrient: Sum(get_eating_nutrient(nutrient)) for nutrient in NUTRIENTS})
+        .order_by()
+    )
+    return {
+        (row["person_card_id"], row["day"]): {nutrient: row[nutrient] or 0.0 for nutrient in NUTRIENTS}
+        for row in rows
+    }
+
+
+def refresh_daily_intake(person_card_id: int, date: datetime.date) -> DailyIntake:
+    """
+    Пересчет сводки КБЖУ за день по исходным приемам пищи.
+    """
+    daily_intake, _ = DailyIntake.objects.update_or_create(
+        person_card_id=person_card_id, date=date, defaults=get_eaten_nutrients(person_card_id, date)
+    )
+    return daily_intake
+
+
+def refresh_daily_intakes(eatings) -> int:
+    """
+    Пересчет сводок за дни, в которые были приемы пищи из eatings.
+    Дни обрабатываются пачками: суммы пачки считаются одним сгруппированным запросом,
+    сводки обновляются и создаются массово. Возвращает число пересчитанных сводок.
+    """
+    days = list(
+        eatings.annotate(day=TruncDate("datetime_add")).values_list("person_card_id", "day").distinct().order_by()
+    )
+    for start in range(0, len(days), DAILY_INTAKE_BATCH_SIZE):
+        batch = days[start : start + DAILY_INTAKE_BATCH_SIZE]
+        person_card_ids = {person_card_id for person_card_id, _ in batch}
+        dates = {day for _, day in batch}
+        nutrients = get_eaten_nutrients_by_card_day(
+            Eating.objects.filter(person_card_id__in=person_card_ids, datetime_add__date__in=dates)
+        )
+        stored = {
+            (row.person_card_id, row.date): row
+            for row in DailyIntake.objects.filter(person_card_id__in=person_card_ids, date__in=dates)
+        }
+        updated, created = [], []
+        for person_card_id, day in batch:
+            values = nutrients.get((person_card_id, day), dict.fromkeys(NUTRIENTS, 0.0))
+            row = stored.get((person_card_id, day))
+            if row is None:
+                created.append(DailyIntake(person_card_id=person_card_id, date=day, **values))
+                continue
+            for nutrient, value in values.items():
+                setattr(row, nutrient, value)
+            updated.append(row)
+        DailyIntake.objects.bulk_update(updated, NUTRIENTS)
+        if created:
+            DailyIntake.objects.bulk_create(created)
+            owner_ids = PersonCard.objects.filter(pk__in={row.person_card_id for row in created}).get_cache_owner_ids()
+            bump_dependent_cache_generations(DailyIntake, owner_ids)
+    return len(days)
+
+
+def refresh_product_nutrients(product_id: int) -> None:
+    """
+    Пересчет после изменения КБЖУ продукта: суммы рецептов с этим продуктом
+    и сводки за дни, когда продукт был съеден отдельно или в составе рецепта.
+    История приемов пищи считается по текущим значениям продукта.
+    """
+    recipe_ids = list(
+        ProductWeight.objects.filter(product_id=product_id, recipe__isnull=False)
+        .values_list("recipe_id", flat=True)
+        .distinct()
+        .order_by()
+    )
+    refresh_recipe_nutrients(recipe_ids)
+    refresh_daily_intakes(Eating.objects.filter(Q(product_weight__product_id=product_id) | Q(recipe_id__in=recipe_ids)))
+
+
+def get_daily_nutrients(person_card_id: int, date: datetime.date, catalog: Union[ProductCatalog, None] = None) -> dict:
+    """
+    Получение КБЖУ за день из сводки.
+    Если сводки еще нет, значения считаются по приемам пищи.
+    """
+    daily_intake = DailyIntake.objects.filter(person_card_id=person_card_id, date=date).values(*NUTRIENTS).first()
+    if daily_intake is None:
+        return get_eaten_nutrients(person_card_id, date, catalog)
+    return daily_intake
+
+
 class CalculateService:
     """
     Расчет КБЖУ.
     """
 
-    def __init__(self, person_card: PersonCard, date: datetime.date):
-        self.measurements = get_measurements(person_card, date)
+    def __init__(
+        self,
+        person_card: PersonCard,
+        date: datetime.date,
+        measurements: Measurement = None,
+        catalog: Union[ProductCatalog, None] = None,
+    ):
+        self.catalog = catalog
+        self.measurements = measurements if measurements is not None else get_measurements(person_card, date)
         self.date = date
         self.id = person_card.pk
         self.gender = person_card.gender
@@ -118,34 +362,42 @@ class CalculateService:
         """
         Расчет текущих показателей КБЖУ в зависимости от даты.
         """
-        products_list = ProductWeight.objects.filter(
-            Q(eating__datetime_add__date=self.date, eating__person_card_id=self.id)
-            | Q(recipe__eating__datetime_add__date=self.date, recipe__eating__person_card_id=self.id)
-        )
-        water_list = sum(
-            Water.objects.filter(eating__datetime_add__date=self.date, eating__person_card_id=self.id).values_list(
-                "weight", flat=True
-            )
+        nutrients = get_daily_nutrients(self.id, self.date, self.catalog)
+        return {nutrient: round(nutrients[nutrient]) for nutrient in NUTRIENTS}
+
+
+def get_current_range(person_card: PersonCard, date_from: datetime.date, date_to: datetime.date) -> list:
+    """
+    Расчет текущих и нормативных показателей КБЖУ по дням за период.
+    Нормативные значения берутся по последним на каждый день замерам.
+    """
+    measurements = list(
+        Measurement.objects.filter(person_card_id=person_card.id, datetime_add__date__lte=date_to).order_by(
+            "datetime_add"
         )
+    )
+    if not measurements:
+        raise ValidationError({"status": "400", "error": "Measurements not found"})
+    eaten = get_eaten_nutrients_by_day(person_card.id, date_from, date_to)
 
-        calories = 0.0
-        proteins = 0.0
-        fats = 0.0
-        carbohydrates = 0.0
-        water = 0.0
-
-        for prod in products_list:
-            product = Product.objects.get(id=prod.product_id)
-            calories += product.calories * prod.weight
-            proteins += product.proteins * prod.weight
-            fats += product.fats * prod.weight
-            carbohydrates += product.carbohydrates * prod.weight
-            water += product.water * prod.weight
+    result = []
+    index = 0
+    day_measurements = None
+    for offset in range((date_to - date_from).days + 1):
+        day = date_from + datetime.timedelta(days=offset)
+        while index < len(measurements) and measurements[index].datetime_add.date() <= day:
+            day_measurements = measurements[index]
+            index += 1
 
-        return {
-            "calories": round(calories),
-            "proteins": round(proteins),
-            "fats": round(fats),
-            "carbohydrates": round(carbohydrates),
-            "water": round(water + water_list),
-        }
+        standard = None
+        if day_measurements is not None:
+            standard = CalculateService(person_card, day, day_measurements).get_standard()
+        nutrients = eaten.get(day, dict.fromkeys(NUTRIENTS, 0.0))
+        result.append(
+            {
+                "date": day,
+                "current": {nutrient: round(nutrients[nutrient]) for nutrient in NUTRIENTS},
+                "standard": standard,
+            }
+        )
+    return result
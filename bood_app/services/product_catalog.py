@@ -0,0 +1,106 @@
+import math
+import time
+from array import array
+from typing import Iterable, Union
+
+from bood_app.models import Product
+from bood_app.utils.cache import get_reference_version
+
+NUTRIENTS = Product.nutrient_fields
+PROPORTIONS = ("proteins_proportion", "fats_proportion", "carbohydrates_proportion")
+VITAMINS = ("a", "b1", "b2", "b3", "e", "c")
+MICROELEMENTS = ("iron", "calcium", "sodium", "potassium", "phosphorus")
+FIELDS = (
+    NUTRIENTS
+    + PROPORTIONS
+    + tuple(f"vitamins__{vitamin}" for vitamin in VITAMINS)
+    + tuple(f"microelements__{element}" for element in MICROELEMENTS)
+)
+CATALOG_MAX_AGE = 60 * 10
+NO_CATEGORY = -1
+
+
+class ProductCatalog:
+    """
+    Снимок каталога продуктов в виде типизированных массивов.
+    Каждое поле хранится отдельным массивом, строка продукта ищется по его id.
+    Пустые значения хранятся как NaN, продукты без категории - с категорией NO_CATEGORY.
+    """
+
+    def __init__(self, rows: Iterable[tuple], version: Union[str, None] = None):
+        self.version = version
+        self.created = time.monotonic()
+        self.ids = array("q")
+        self.category_ids = array("q")
+        self.columns = {field: array("d") for field in FIELDS}
+        self.index = {}
+        for product_id, category_id, *values in rows:
+            self.index[product_id] = len(self.ids)
+            self.ids.append(product_id)
+            self.category_ids.append(NO_CATEGORY if category_id is None else category_id)
+            for field, value in zip(FIELDS, values):
+                self.columns[field].append(math.nan if value is None else value)
+
+    @classmethod
+    def load(cls, version: Union[str, None] = None) -> "ProductCatalog":
+        rows = Product.objects.order_by("id").values_list("id", "category_id", *FIELDS)
+        return cls(rows, version)
+
+    def is_actual(self, version: Union[str, None]) -> bool:
+        return version is not None and version == self.version and time.monotonic() - self.created < CATALOG_MAX_AGE
+
+    def __contains__(self, product_id: int) -> bool:
+        return product_id in self.index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get(self, product_id: int, field: str) -> Union[float, None]:
+        value = self.columns[field][self.index[product_id]]
+        return None if math.isnan(value) else value
+
+    def get_category(self, product_id: int) -> Union[int, None]:
+        category_id = self.category_ids[self.index[product_id]]
+        return None if category_id == NO_CATEGORY else category_id
+
+    def rows(self, *fields: str) -> Iterable[tuple]:
+        """
+        Строки (id, category_id, *fields) в порядке id.
+        """
+        columns = [self.columns[field] for field in fields]
+        for row, product_id in enumerate(self.ids):
+            category_id = self.category_ids[row]
+            values = (None if math.isnan(column[row]) else column[row] for column in columns)
+            yield (product_id, None if category_id == NO_CATEGORY else category_id, *values)
+
+    def sum_nutrients(self, product_weights: Iterable[tuple]) -> dict:
+        """
+        Суммарные КБЖУ и вода по парам (id продукта, вес). Пустые значения не учитываются, как в SUM.
+        """
+        result = dict.fromkeys(NUTRIENTS, 0.0)
+        for product_id, weight in product_weights:
+            row = self.index[product_id]
+            for nutrient in NUTRIENTS:
+                value = self.columns[nutrient][row]
+                if not math.isnan(value):
+                    result[nutrient] += value * weight
+        return result
+
+
+_product_catalog: Union[ProductCatalog, None] = None
+
+
+def get_product_catalog(product_ids: Iterable[int] = ()) -> ProductCatalog:
+    """
+    Каталог продуктов текущего процесса. Перезагружается при изменении версии каталога
+    или если в нем нет какого-либо из product_ids.
+    """
+    global _product_catalog
+    version = get_reference_version("product")
+    if (
+        _product_catalog is None
+        or not _product_catalog.is_actual(version)
+        or any(product_id not in _product_catalog for product_id in product_ids)
+    ):
+        _product_catalog = ProductCatalog.load(version)
+    return _product_catalog
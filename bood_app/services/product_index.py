@@ -0,0 +1,106 @@
+from bisect import bisect_left
+from typing import Iterable, Union
+
+from bood_app.services.product_catalog import PROPORTIONS, ProductCatalog, get_product_catalog
+
+
+class ProductProportionIndex:
+    """
+    Индекс продуктов по пропорциям БЖУ.
+    Для каждой пропорции хранится отсортированный массив значений,
+    поиск ближайших продуктов выполняется бинарным поиском без запросов к БД.
+    """
+
+    def __init__(self, rows: Iterable[tuple], catalog: Union[ProductCatalog, None] = None):
+        self.catalog = catalog
+        self.categories = {}
+        self.proportions = {}
+        for product_id, category_id, *proportions in rows:
+            if category_id is None:
+                continue
+            self.categories[product_id] = category_id
+            self.proportions[product_id] = dict(zip(PROPORTIONS, proportions))
+
+        self.values = {}
+        self.ids = {}
+        self.empty_ids = {}
+        for nutrient in PROPORTIONS:
+            pairs = sorted(
+                (proportion[nutrient], product_id)
+                for product_id, proportion in self.proportions.items()
+                if proportion[nutrient] is not None
+            )
+            self.values[nutrient] = [value for value, _ in pairs]
+            self.ids[nutrient] = [product_id for _, product_id in pairs]
+            self.empty_ids[nutrient] = sorted(
+                product_id for product_id, proportion in self.proportions.items() if proportion[nutrient] is None
+            )
+
+    @classmethod
+    def from_catalog(cls, catalog: ProductCatalog) -> "ProductProportionIndex":
+        return cls(catalog.rows(*PROPORTIONS), catalog)
+
+    def find_nearest(
+        self, nutrient: str, value: float, count: int, exclude_ids: Iterable[int], exclude_categories: Iterable[int]
+    ) -> list:
+        """
+        Получить id продуктов с категорией, наиболее близких по пропорции nutrient к value.
+        """
+        exclude_ids = set(exclude_ids)
+        exclude_categories = set(exclude_categories)
+        values = self.values[nutrient]
+        ids = self.ids[nutrient]
+
+        def is_allowed(product_id: int) -> bool:
+            return product_id not in exclude_ids and self.categories[product_id] not in exclude_categories
+
+        result = []
+        right = bisect_left(values, value)
+        left = right - 1
+        while len(result) < count and (left >= 0 or right < len(values)):
+            if right >= len(values) or (left >= 0 and value - values[left] <= values[right] - value):
+                product_id = ids[left]
+                left -= 1
+            else:
+                product_id = ids[right]
+                right += 1
+            if is_allowed(product_id):
+                result.append(product_id)
+
+        # Продукты без значения пропорции идут последними, как NULL при сортировке в БД
+        for product_id in self.empty_ids[nutrient]:
+            if len(result) >= count:
+                break
+            if is_allowed(product_id):
+                result.append(product_id)
+        return result
+
+    def order_by_distance(self, product_ids: Iterable[int], nutrient: str, value: float) -> list:
+        """
+        Отсортировать id продуктов по близости пропорции nutrient к value.
+        При равной близости продукты идут по id, как при сортировке в БД.
+        """
+
+        def distance(product_id: int) -> float:
+            proportion = self.proportions[product_id][nutrient]
+            return float("inf") if proportion is None else abs(proportion - value)
+
+        return sorted(product_ids, key=lambda product_id: (distance(product_id), product_id))
+
+    def get_category(self, product_id: int) -> int:
+        return self.categories[product_id]
+
+
+_product_index: Union[ProductProportionIndex, None] = None
+
+
+def get_product_index(catalog: Union[ProductCatalog, None] = None) -> ProductProportionIndex:
+    """
+    Индекс продуктов текущего процесса. Перестраивается вместе с каталогом продуктов.
+    """
+    global _product_index
+    if catalog is None:
+        catalog = get_product_catalog()
+    if _product_index is None or _product_index.catalog is not catalog:
+        _product_index = ProductProportionIndex.from_catalog(catalog)
+    return _product_index
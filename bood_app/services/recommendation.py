@@ -1,11 +1,90 @@
 from datetime import datetime
+from typing import Union
 
-from django.db.models import F, Q
-from django.db.models.functions import Abs
+from django.db.models import CharField, Value
 from rest_framework.exceptions import ValidationError
 
-from bood_app.models import PersonCard, Product, ProductCategory
-from bood_app.services.calculate import CalculateService
+from bood_app.models import PersonCard, Product, Measurement
+from bood_app.services.calculate import CalculateService, get_eaten_product_weights, get_measurements
+from bood_app.services.product_catalog import ProductCatalog, get_product_catalog
+from bood_app.services.product_index import get_product_index
+
+
+def get_exclude_ids(person_card_id: int) -> tuple:
+    """
+    Id исключенных пользователем продуктов и категорий продуктов одним запросом.
+    """
+    exclude_products = (
+        PersonCard.exclude_products.through.objects.filter(personcard_id=person_card_id)
+        .annotate(kind=Value("product", output_field=CharField()))
+        .values_list("kind", "product_id")
+    )
+    exclude_categories = (
+        PersonCard.exclude_category.through.objects.filter(personcard_id=person_card_id)
+        .annotate(kind=Value("category", output_field=CharField()))
+        .values_list("kind", "productcategory_id")
+    )
+    exclude_products_ids = []
+    exclude_categories_ids = []
+    for kind, exclude_id in exclude_products.union(exclude_categories, all=True):
+        if kind == "product":
+            exclude_products_ids.append(exclude_id)
+        else:
+            exclude_categories_ids.append(exclude_id)
+    return exclude_products_ids, exclude_categories_ids
+
+
+def get_products_by_ids(product_ids: list) -> list:
+    """
+    Продукты с категориями в порядке product_ids одним запросом.
+    """
+    products = Product.objects.select_related("category").in_bulk(product_ids)
+    return [products[product_id] for product_id in product_ids if product_id in products]
+
+
+class RecommendationContext:
+    """
+    Данные пользователя за день, необходимые для подбора рекомендаций.
+    Загружаются фиксированным числом запросов независимо от количества приемов пищи.
+    Исключения пользователя нужны только для подбора продуктов и загружаются при первом обращении.
+    """
+
+    def __init__(
+        self,
+        measurements: Measurement,
+        eaten_product_weights: list,
+        exclude_products_ids: Union[list, None],
+        exclude_categories_ids: Union[list, None],
+        catalog: ProductCatalog,
+        person_card_id: Union[int, None] = None,
+    ):
+        self.measurements = measurements
+        self.eaten_product_weights = eaten_product_weights
+        self._exclude_ids = None
+        if exclude_products_ids is not None and exclude_categories_ids is not None:
+            self._exclude_ids = (exclude_products_ids, exclude_categories_ids)
+        self.catalog = catalog
+        self.person_card_id = person_card_id
+
+    def get_exclude_ids(self) -> tuple:
+        if self._exclude_ids is None:
+            self._exclude_ids = get_exclude_ids(self.person_card_id)
+        return self._exclude_ids
+
+    @property
+    def exclude_products_ids(self) -> list:
+        return self.get_exclude_ids()[0]
+
+    @property
+    def exclude_categories_ids(self) -> list:
+        return self.get_exclude_ids()[1]
+
+    @classmethod
+    def load(cls, person_card: PersonCard, date: datetime.date) -> "RecommendationContext":
+        measurements = get_measurements(person_card, date)
+        eaten_product_weights = get_eaten_product_weights(person_card.pk, date)
+        catalog = get_product_catalog(product_id for product_id, _ in eaten_product_weights)
+        return cls(measurements, eaten_product_weights, None, None, catalog, person_card.pk)
 
 
 class RecommendationService(CalculateService):
@@ -13,8 +92,9 @@ class RecommendationService(CalculateService):
     Подбор рекомендаций.
     """
 
-    def __init__(self, person_card: PersonCard, date: datetime.date):
-        super().__init__(person_card, date)
+    def __init__(self, person_card: PersonCard, date: datetime.date, context: RecommendationContext = None):
+        self.context = context if context is not None else RecommendationContext.load(person_card, date)
+        super().__init__(person_card, date, self.context.measurements, self.context.catalog)
         self.person_card = person_card
         self.date = date
         self.standard = self.get_standard()
@@ -23,16 +103,7 @@ class RecommendationService(CalculateService):
         self.split_fats = self.standard["fats"] - self.current["fats"]
         self.split_carbohydrates = self.standard["carbohydrates"] - self.current["carbohydrates"]
         self.split_proportion = [self.split_proteins, self.split_fats, self.split_carbohydrates]
-        self.eaten_products = Product.objects.filter(
-            Q(
-                product_weight__eating__datetime_add__date=self.date,
-                product_weight__eating__person_card_id=self.person_card.pk,
-            )
-            | Q(
-                product_weight__recipe__eating__datetime_add__date=self.date,
-                product_weight__recipe__eating__person_card_id=self.person_card.pk,
-            )
-        )
+        self.eaten_product_weights = self.context.eaten_product_weights
 
     @staticmethod
     def __get_nutrient_proportion_dict(
@@ -44,9 +115,9 @@ class RecommendationService(CalculateService):
             "carbohydrates_proportion": carbohydrates_proportion,
         }
 
-    def __find_exclude_product(self) -> Product:
+    def __find_exclude_product_id(self) -> int:
         """
-        Поиск рекомендованного к исключению продукта.
+        Поиск id рекомендованного к исключению продукта.
         """
         proportion = {
             "proteins": self.split_proteins,
@@ -54,50 +125,45 @@ class RecommendationService(CalculateService):
             "carbohydrates": self.split_carbohydrates,
         }
         max_value = sorted(proportion.items(), key=lambda item: item[1])[-1]
-        result = self.eaten_products.order_by(max_value[0]).first()
-        return result
+
+        # Продукты без значения идут последними, как NULL при сортировке в БД
+        def nutrient_value(product_id: int) -> tuple:
+            value = self.catalog.get(product_id, max_value[0])
+            return value is None, value or 0.0, product_id
+
+        return min((product_id for product_id, _ in self.eaten_product_weights), key=nutrient_value)
 
     def __get_products_group_by_proportion(self, nutrient_dict: dict) -> list:
         """
         Получить список продуктов наиболее соответствующих пропорциям.
         """
         nutrient_list = sorted(nutrient_dict.items(), key=lambda item: item[1], reverse=True)
-        exclude_products_ids = list(Product.objects.filter(personcard=self.person_card).values_list("id", flat=True))
-        exclude_categories_ids = list(
-            ProductCategory.objects.filter(personcard=self.person_card).values_list("id", flat=True)
-        )
-
-        # Исключение из списка продуктов рекомендованный к исключению продукт
-        exclude_eaten_product_by_recommendation = self.__find_exclude_product()
-        exclude_products_ids.append(exclude_eaten_product_by_recommendation.id)
+        exclude_products_ids = [*self.context.exclude_products_ids, self.__find_exclude_product_id()]
+        exclude_categories_ids = self.context.exclude_categories_ids
 
         # Получаем список продуктов наиболее близких по пропорциям nutrient_list
-        first_abs = Abs(F(nutrient_list[0][0]) - nutrient_list[0][1])
-        second_abs = Abs(F(nutrient_list[1][0]) - nutrient_list[1][1])
-        first_query = (
-            Product.objects.annotate(first_abs=first_abs)
-            .filter(category__isnull=False)
-            .exclude(Q(id__in=exclude_products_ids) | Q(category__id__in=exclude_categories_ids))
-            .order_by("first_abs")
-            .values("id")[:30]
+        product_index = get_product_index(self.catalog)
+        first_ids = product_index.find_nearest(
+            nutrient_list[0][0], nutrient_list[0][1], 30, exclude_products_ids, exclude_categories_ids
         )
-        second_query = Product.objects.annotate(second_abs=second_abs).filter(pk__in=first_query).order_by("second_abs")
+        second_ids = product_index.order_by_distance(first_ids, nutrient_list[1][0], nutrient_list[1][1])
 
         # Получаем 4 наиболее подходящих продукта с разными категориями
         list_of_uniques_categories = []
-        result = []
-        for i in second_query:
-            if i.category not in list_of_uniques_categories and len(result) < 4:
-                result.append(i)
-            list_of_uniques_categories.append(i.category)
-        return result
+        result_ids = []
+        for product_id in second_ids:
+            category_id = product_index.get_category(product_id)
+            if category_id not in list_of_uniques_categories and len(result_ids) < 4:
+                result_ids.append(product_id)
+            list_of_uniques_categories.append(category_id)
+        return get_products_by_ids(result_ids)
 
     def get_include_products(self) -> list:
         """
         Получение списка рекомендованных продуктов.
         """
         # Необходимо съесть минимум 3 продукта
-        if len(self.eaten_products) > 2:
+        if len(self.eaten_product_weights) > 2:
             # БЖУ ниже нормы
             if self.split_proteins > 0 and self.split_fats > 0 and self.split_carbohydrates > 0:
                 min_value = min(self.split_proportion)
@@ -187,7 +253,7 @@ class RecommendationService(CalculateService):
         Получение рекомендованного к исключению продукта.
         """
         # Необходимо съесть минимум 3 продукта
-        if len(self.eaten_products) > 2:
-            return self.__find_exclude_product()
+        if len(self.eaten_product_weights) > 2:
+            return Product.objects.select_related("category").get(pk=self.__find_exclude_product_id())
         else:
             raise ValidationError({"status": "400", "error": "There are too low eating to make recommendations"})
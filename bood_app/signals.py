@@ -1,7 +1,29 @@
-from django.db.models.signals import pre_delete
+from django.db.models import QuerySet
+from django.db.models.signals import pre_delete, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 
-from bood_app.models import Product, Eating
+from bood_account.models import Person
+from bood_app.models import (
+    Product,
+    Eating,
+    PersonCard,
+    ProductWeight,
+    Recipe,
+    ProductCategory,
+    FemaleType,
+    FAQ,
+    get_cache_owner_ids,
+    person_card_owners,
+)
+from bood_app.services.calculate import (
+    NUTRIENTS,
+    refresh_daily_intake,
+    refresh_daily_intakes,
+    refresh_product_nutrients,
+    refresh_recipe_nutrients,
+)
+from bood_app.utils.cache import bump_reference_version
+from bood_app.utils.cache_dependencies import bump_dependent_cache_generations, get_cache_dependency_models
 
 
 @receiver(pre_delete, sender=Product)
@@ -21,6 +43,46 @@ def set_delete_product(sender, instance, **kwargs) -> None:
         microelements.delete()
 
 
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def set_change_product(sender, instance, **kwargs) -> None:
+    """
+    Обновление версии каталога продуктов для перестроения индекса пропорций и сброса кеша списка
+    """
+    bump_reference_version("product")
+
+
+@receiver(post_save, sender=Product)
+def set_change_product_nutrients(sender, instance, created, update_fields=None, **kwargs) -> None:
+    """
+    Пересчет сумм рецептов и сводок за дни, в которые продукт был съеден, после изменения КБЖУ или воды продукта.
+    Новый продукт еще нигде не использован. Сохранение без изменения КБЖУ и воды ничего не пересчитывает.
+    """
+    changed = not created and instance.has_changed_nutrients()
+    if update_fields is not None and not set(update_fields) & set(NUTRIENTS):
+        changed = False
+    if changed:
+        refresh_product_nutrients(instance.pk)
+    instance.saved_nutrients = instance.get_nutrients()
+
+
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+@receiver(post_save, sender=FemaleType)
+@receiver(post_delete, sender=FemaleType)
+@receiver(post_save, sender=FAQ)
+@receiver(post_delete, sender=FAQ)
+def set_change_reference(sender, instance, **kwargs) -> None:
+    """
+    Обновление версии справочника для сброса его кеша во всех процессах
+    """
+    tables = {ProductCategory: "product_category", FemaleType: "female_type", FAQ: "faq"}
+    bump_reference_version(tables[sender])
+    if sender is ProductCategory:
+        # Страницы продуктов содержат данные категории, поэтому сбрасываются вместе с ней
+        bump_reference_version("product")
+
+
 @receiver(pre_delete, sender=Eating)
 def set_delete_eating(sender, instance, **kwargs) -> None:
     """
@@ -36,3 +98,84 @@ def set_delete_eating(sender, instance, **kwargs) -> None:
         instance.water = None
         instance.save()
         water.delete()
+
+
+@receiver(post_save, sender=Eating)
+def set_save_eating(sender, instance, **kwargs) -> None:
+    """
+    Обновление сводки за день после создания или изменения приема пищи
+    """
+    refresh_daily_intake(instance.person_card_id, instance.datetime_add.date())
+
+
+@receiver(post_delete, sender=Eating)
+def set_after_delete_eating(sender, instance, origin=None, **kwargs) -> None:
+    """
+    Обновление сводки за день после удаления приема пищи.
+    При удалении карточки или пользователя сводка удаляется каскадно.
+    """
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model in (PersonCard, Person):
+        return
+    refresh_daily_intake(instance.person_card_id, instance.datetime_add.date())
+
+
+@receiver(post_save, sender=ProductWeight)
+@receiver(post_delete, sender=ProductWeight)
+def set_change_recipe_product_weight(sender, instance, origin=None, **kwargs) -> None:
+    """
+    Пересчет сумм КБЖУ рецепта и сводок за дни, когда рецепт был съеден, при изменении его продуктов по одному.
+    Сериализатор рецепта пишет продукты пачкой и сохраняет суммы вместе с рецептом.
+    """
+    if instance.recipe_id is None:
+        return
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin_model in (Recipe, PersonCard, Person):
+        return
+    refresh_recipe_nutrients([instance.recipe_id])
+    refresh_daily_intakes(Eating.objects.filter(recipe_id=instance.recipe_id))
+
+
+@receiver(post_save, sender=PersonCard)
+def set_save_person_card(sender, instance, **kwargs) -> None:
+    """
+    Запоминание владельца карточки
+    """
+    person_card_owners.set(instance.pk, instance.person_id)
+
+
+@receiver(post_delete, sender=PersonCard)
+def set_after_delete_person_card(sender, instance, **kwargs) -> None:
+    person_card_owners.delete(instance.pk)
+
+
+def set_change_cache_dependency(sender, instance, **kwargs) -> None:
+    """
+    Сброс кеша представлений, зависящих от модели, у владельцев записи.
+    При удалении владельцы определяются до удаления записи и связанных с ней объектов.
+    """
+    bump_dependent_cache_generations(sender, get_cache_owner_ids(instance))
+
+
+def set_change_cache_dependency_m2m(sender, instance, action, reverse, pk_set, **kwargs) -> None:
+    """
+    Сброс кеша представлений, зависящих от связи многие-ко-многим карточки.
+    При изменении со стороны связанной модели затрагиваются все связанные карточки.
+    """
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            bump_dependent_cache_generations(sender, get_cache_owner_ids(instance))
+        return
+    if action == "pre_clear":
+        pk_set = sender.objects.filter(**{instance._meta.model_name: instance}).values("personcard_id")
+    elif action not in ("post_add", "post_remove"):
+        return
+    bump_dependent_cache_generations(sender, PersonCard.objects.filter(pk__in=pk_set).get_cache_owner_ids())
+
+
+for dependency_model in get_cache_dependency_models():
+    if dependency_model._meta.auto_created:
+        m2m_changed.connect(set_change_cache_dependency_m2m, sender=dependency_model)
+    else:
+        post_save.connect(set_change_cache_dependency, sender=dependency_model)
+        pre_delete.connect(set_change_cache_dependency, sender=dependency_model)
@@ -1,3 +1,7 @@
+from typing import Any, Callable, Union
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from bood_account.models import Person
@@ -139,3 +143,32 @@ class BaseInitTestCase(APITestCase):
         response = self.client.post(create_jwt_url, create_jwt_data)
         access_token = response.data["access"]
         return {"Authorization": f"JWT {access_token}"}
+
+    def assertQueryCountStable(
+        self,
+        action: Union[str, Callable[[], Any]],
+        grow: Union[Callable[[], None], None] = None,
+        action_after_grow: Union[Callable[[], Any], None] = None,
+        headers: Union[dict, None] = None,
+    ) -> tuple:
+        """
+        Проверка, что число запросов не растет вместе с объемом данных.
+        action выполняется до и после grow, добавляющего данные. Если передан action_after_grow,
+        второй раз выполняется он, например запрос с большим числом элементов.
+        Строка вместо action - GET-запрос по этому адресу с заголовками headers.
+        Возвращает результаты первого и второго вызовов.
+        """
+        if isinstance(action, str):
+            url = action
+
+            def action() -> Any:
+                return self.client.get(url, headers=headers)
+
+        with CaptureQueriesContext(connection) as few_items:
+            few_result = action()
+        if grow is not None:
+            grow()
+        with CaptureQueriesContext(connection) as many_items:
+            many_result = (action_after_grow or action)()
+        self.assertEqual(len(few_items), len(many_items))
+        return few_result, many_result
@@ -0,0 +1,321 @@
+import datetime
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+import bood_account.urls
+import bood_app.urls
+from bood_account.models import Person
+from bood_app.models import (
+    FAQ,
+    Eating,
+    FemaleType,
+    Measurement,
+    PersonCard,
+    Product,
+    ProductCategory,
+    ProductWeight,
+    Recipe,
+    Water,
+)
+
+# Число запросов не зависит от машины и хранится в репозитории, время и память - только в локальном файле
+BASELINE_PATH = Path(__file__).with_name("benchmark_baseline.json")
+MACHINE_BASELINE = os.environ.get("BOOD_BENCHMARK_MACHINE_BASELINE")
+MACHINE_BASELINE_PATH = Path(MACHINE_BASELINE) if MACHINE_BASELINE else None
+BENCHMARK_ENABLED = bool(os.environ.get("BOOD_BENCHMARK"))
+BENCHMARK_UPDATE = bool(os.environ.get("BOOD_BENCHMARK_UPDATE"))
+REPEAT = 5
+
+QUERY_TOLERANCE = 0
+TIME_TOLERANCE = 1.5
+TIME_SLACK = 0.005
+MEMORY_TOLERANCE = 1.3
+MEMORY_SLACK = 64 * 1024
+
+CATEGORIES = 20
+PRODUCTS = 3000
+DAYS = 120
+EATINGS_PER_DAY = 5
+RECIPES = 40
+RECIPE_PRODUCTS = 6
+OTHER_USERS = 30
+OTHER_USER_EATINGS = 60
+
+SKIPPED_ROUTES = {
+    "product_elasticsearch": "требует Elasticsearch",
+    "get_activation": "пересылает запрос по HTTP",
+    "person-activation": "одноразовый токен из письма",
+    "person-resend-activation": "отправка письма",
+    "person-reset-password": "отправка письма",
+    "person-reset-password-confirm": "одноразовый токен из письма",
+    "person-set-password": "меняет пароль пользователя бенчмарка",
+    "person-reset-username": "отправка письма",
+    "person-reset-username-confirm": "одноразовый токен из письма",
+    "person-set-username": "меняет логин пользователя бенчмарка",
+}
+
+
+def write_baseline(path: Path, results: dict) -> None:
+    path.write_text(json.dumps(results, indent=4, ensure_ascii=False, sort_keys=True) + "\n")
+
+
+def get_route_names(patterns) -> set:
+    names = set()
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            names |= get_route_names(pattern.url_patterns)
+        elif pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+@tag("benchmark")
+@skipUnless(BENCHMARK_ENABLED, "Бенчмарк запускается с переменной окружения BOOD_BENCHMARK=1")
+class EndpointBenchmarkTestCase(APITestCase):
+    """
+    Число запросов, время и пиковая память каждого эндпоинта на реалистичном объеме данных.
+    Число запросов сравнивается с базовой линией из репозитория. Время и память зависят от машины
+    и сравниваются, только если BOOD_BENCHMARK_MACHINE_BASELINE указывает файл базовой линии этой машины.
+    BOOD_BENCHMARK_UPDATE=1 перезаписывает обе базовые линии.
+    """
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        categories = ProductCategory.objects.bulk_create(
+            ProductCategory(title=f"Категория {number}") for number in range(CATEGORIES)
+        )
+        cls.products = Product.objects.bulk_create(
+            Product(
+                title=f"Продукт {number}",
+                proteins=number % 30,
+                fats=number % 20,
+                carbohydrates=number % 70,
+                calories=number % 500,
+                water=number % 90,
+                proteins_proportion=(number % 30) / 120,
+                fats_proportion=(number % 20) / 120,
+                carbohydrates_proportion=(number % 70) / 120,
+                category=categories[number % CATEGORIES],
+            )
+            for number in range(PRODUCTS)
+        )
+        FemaleType.objects.create(title="Беременная")
+        FAQ.objects.bulk_create(FAQ(question=f"Вопрос {number}", answer="Ответ") for number in range(30))
+
+        cls.person = Person.objects.create_superuser(email="benchmark@bood.com", password="12345")
+        cls.person_card = cls.create_person_card(cls.person, DAYS, EATINGS_PER_DAY)
+        cls.person_card.exclude_products.set(cls.products[:30])
+        cls.person_card.exclude_category.set(categories[:3])
+        for number in range(OTHER_USERS):
+            person = Person.objects.create_user(email=f"user{number}@bood.com", password="12345")
+            cls.create_person_card(person, OTHER_USER_EATINGS // EATINGS_PER_DAY, EATINGS_PER_DAY)
+        call_command("rebuild_recipe_nutrients", stdout=StringIO())
+        call_command("rebuild_daily_intake", stdout=StringIO())
+
+        cls.eating = Eating.objects.filter(person_card=cls.person_card).order_by("-id").first()
+        cls.measurement = Measurement.objects.filter(person_card=cls.person_card).order_by("-id").first()
+        cls.recipe = Recipe.objects.filter(person_card=cls.person_card).order_by("-id").first()
+
+    @classmethod
+    def create_person_card(cls, person: Person, days: int, eatings_per_day: int) -> PersonCard:
+        person_card = PersonCard.objects.create(height=175, age=30, gender="male", activity=1.2, person=person)
+        now = timezone.now()
+        measurements = Measurement.objects.bulk_create(
+            Measurement(weight=80 + day % 5, chest=100, waist=70, hips=90, hand=16, person_card=person_card)
+            for day in range(0, days, 3)
+        )
+        for measurement, day in zip(measurements, range(days - 1, -1, -3)):
+            measurement.datetime_add = now - datetime.timedelta(days=day)
+        Measurement.objects.bulk_update(measurements, ["datetime_add"])
+
+        recipes = Recipe.objects.bulk_create(
+            Recipe(title=f"Рецепт {number}", person_card=person_card) for number in range(RECIPES)
+        )
+        ProductWeight.objects.bulk_create(
+            ProductWeight(weight=50, product=cls.products[(number * 7 + item) % PRODUCTS], recipe=recipe)
+            for number, recipe in enumerate(recipes)
+            for item in range(RECIPE_PRODUCTS)
+        )
+
+        count = days * eatings_per_day
+        product_weights = ProductWeight.objects.bulk_create(
+            ProductWeight(weight=100, product=cls.products[number % PRODUCTS]) for number in range(count)
+        )
+        waters = Water.objects.bulk_create(Water(weight=250) for _ in range(count))
+        eatings = []
+        for number in range(count):
+            kind = number % 3
+            eatings.append(
+                Eating(
+                    person_card=person_card,
+                    product_weight=product_weights[number] if kind == 0 else None,
+                    recipe=recipes[number % RECIPES] if kind == 1 else None,
+                    water=waters[number] if kind == 2 else None,
+                )
+            )
+        eatings = Eating.objects.bulk_create(eatings)
+        for number, eating in enumerate(eatings):
+            eating.datetime_add = now - datetime.timedelta(days=number // eatings_per_day)
+        Eating.objects.bulk_update(eatings, ["datetime_add"])
+        return person_card
+
+    def setUp(self) -> None:
+        response = self.client.post(reverse("jwt-create"), {"email": "benchmark@bood.com", "password": "12345"})
+        self.refresh = response.data["refresh"]
+        self.token = {"Authorization": f"JWT {response.data['access']}"}
+
+    def get_endpoints(self) -> list:
+        """
+        Маршрут, метод, адрес и тело запроса
+        """
+        today = timezone.now().date()
+        return [
+            ("api-root", "get", reverse("api-root"), None),
+            ("products-list", "get", reverse("products-list"), None),
+            ("products-list", "get", reverse("products-list"), {"search": "Продукт 1", "limit": 100, "offset": 500}),
+            ("products_category-list", "get", reverse("products_category-list"), None),
+            ("femaletypes-list", "get", reverse("femaletypes-list"), None),
+            ("faq-list", "get", reverse("faq-list"), None),
+            ("person_card-list", "get", reverse("person_card-list"), None),
+            ("person_card-detail", "patch", reverse("person_card-detail", args=(self.person_card.id,)), {"age": 31}),
+            ("eating-list", "get", reverse("eating-list"), None),
+            ("eating-list", "get", reverse("eating-list"), {"cursor": ""}),
+            ("eating-list", "get", reverse("eating-list"), {"fields": "id,datetime_add,recipe", "expand": ""}),
+            ("eating-detail", "get", reverse("eating-detail", args=(self.eating.id,)), None),
+            (
+                "eating-list",
+                "post",
+                reverse("eating-list"),
+                {"product_weight": {"product": self.products[0].id, "weight": 100}},
+            ),
+            (
+                "eating-bulk",
+                "post",
+                reverse("eating-bulk"),
+                [{"product_weight": {"product": product.id, "weight": 100}} for product in self.products[:25]]
+                + [{"recipe": self.recipe.id}] * 20
+                + [{"water": {"weight": 250}}] * 5,
+            ),
+            ("measurements-list", "get", reverse("measurements-list"), None),
+            ("measurements-list", "get", reverse("measurements-list"), {"limit": 20, "offset": 30}),
+            ("measurements-list", "get", reverse("measurements-list"), {"cursor": "", "limit": 20}),
+            ("measurements-detail", "get", reverse("measurements-detail", args=(self.measurement.id,)), None),
+            (
+                "measurements-list",
+                "post",
+                reverse("measurements-list"),
+                {"weight": 80, "chest": 100, "waist": 70, "hips": 90, "hand": 16},
+            ),
+            ("recipes-list", "get", reverse("recipes-list"), None),
+            ("recipes-detail", "get", reverse("recipes-detail", args=(self.recipe.id,)), None),
+            (
+                "recipes-list",
+                "post",
+                reverse("recipes-list"),
+                {
+                    "title": "Салат",
+                    "product_weight": [
+                        {"product": self.products[0].id, "weight": 50},
+                        {"product": self.products[1].id, "weight": 70},
+                    ],
+                },
+            ),
+            ("standard", "get", reverse("standard"), None),
+            ("current", "get", reverse("current"), None),
+            (
+                "current_range",
+                "get",
+                reverse("current_range"),
+                {"from": str(today - datetime.timedelta(days=30)), "to": str(today)},
+            ),
+            ("recommendation_include", "get", reverse("recommendation_include"), None),
+            ("recommendation_exclude", "get", reverse("recommendation_exclude"), None),
+            ("cache_metrics", "get", reverse("cache_metrics"), None),
+            ("cache_metrics_prometheus", "get", reverse("cache_metrics_prometheus"), None),
+            ("person-list", "get", reverse("person-list"), None),
+            ("person-me", "get", reverse("person-me"), None),
+            ("person-detail", "get", reverse("person-detail", args=(self.person.id,)), None),
+            ("jwt-create", "post", reverse("jwt-create"), {"email": "benchmark@bood.com", "password": "12345"}),
+            ("jwt-refresh", "post", reverse("jwt-refresh"), {"refresh": self.refresh}),
+            ("jwt-verify", "post", reverse("jwt-verify"), {"token": self.refresh}),
+        ]
+
+    def request(self, method: str, url: str, data):
+        if method == "get":
+            response = self.client.get(url, data, headers=self.token)
+        else:
+            response = getattr(self.client, method)(url, data, headers=self.token, format="json")
+        self.assertLess(response.status_code, 400, f"{method.upper()} {url}: {response.status_code}")
+        return response
+
+    def measure(self, method: str, url: str, data) -> dict:
+        """
+        Запросы и пиковая память по одному вызову, время - медиана REPEAT вызовов без трассировки памяти.
+        Число запросов берется сразу: следующий запрос клиента очищает журнал запросов соединения.
+        """
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                self.request(method, url, data)
+            query_count = len(queries)
+            _, memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        durations = []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            self.request(method, url, data)
+            durations.append(time.perf_counter() - start)
+        return {"queries": query_count, "time": statistics.median(durations), "memory": memory}
+
+    def test_routes_covered(self) -> None:
+        routes = get_route_names(bood_app.urls.urlpatterns) | get_route_names(bood_account.urls.urlpatterns)
+        benchmarked = {route for route, *_ in self.get_endpoints()}
+        self.assertEqual(routes - benchmarked - set(SKIPPED_ROUTES), set())
+
+    def test_endpoints(self) -> None:
+        results = {}
+        for route, method, url, data in self.get_endpoints():
+            name = f"{method.upper()} {route}"
+            number = 1
+            while (key := name if number == 1 else f"{name} #{number}") in results:
+                number += 1
+            results[key] = self.measure(method, url, data)
+
+        if BENCHMARK_UPDATE:
+            write_baseline(BASELINE_PATH, {key: {"queries": result["queries"]} for key, result in results.items()})
+            if MACHINE_BASELINE_PATH is not None:
+                write_baseline(
+                    MACHINE_BASELINE_PATH,
+                    {key: {"time": result["time"], "memory": result["memory"]} for key, result in results.items()},
+                )
+            return
+        self.assertTrue(BASELINE_PATH.exists(), "Базовой линии нет, запустите с BOOD_BENCHMARK_UPDATE=1")
+        baseline = json.loads(BASELINE_PATH.read_text())
+        machine_baseline = {}
+        if MACHINE_BASELINE_PATH is not None and MACHINE_BASELINE_PATH.exists():
+            machine_baseline = json.loads(MACHINE_BASELINE_PATH.read_text())
+        for endpoint, result in results.items():
+            with self.subTest(endpoint=endpoint):
+                self.assertIn(endpoint, baseline, "Нет базовой линии для эндпоинта")
+                self.assertLessEqual(result["queries"], baseline[endpoint]["queries"] + QUERY_TOLERANCE, result)
+                expected = machine_baseline.get(endpoint)
+                if expected is None:
+                    continue
+                self.assertLessEqual(result["time"], expected["time"] * TIME_TOLERANCE + TIME_SLACK, result)
+                self.assertLessEqual(result["memory"], expected["memory"] * MEMORY_TOLERANCE + MEMORY_SLACK, result)
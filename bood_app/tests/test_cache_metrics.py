@@ -0,0 +1,117 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from bood_account.models import Person
+from bood_app.tests.base_classes import BaseInitTestCase
+from bood_app.utils.cache import NAMESPACE_METRIC_PREFIXES, set_cache_value, set_new_cache_generations
+from bood_app.utils.cache_metrics import CacheMetrics, cache_metrics
+from bood_app.utils.cache_serializer import CompressedRedisSerializer, compression_stats, pop_stored_size
+
+
+class CacheMetricsTestCase(BaseInitTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.token = self.get_authorization(1)
+        self.url = reverse("cache_metrics")
+        self.url_prometheus = reverse("cache_metrics_prometheus")
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_get_valid(self) -> None:
+        cache.clear()
+        cache_metrics.clear()
+        self.client.get(reverse("measurements-list"), headers=self.token)
+        self.client.get(reverse("measurements-list"), headers=self.token)
+
+        response = self.client.get(self.url, headers=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["counters"]["measurement"], {"miss": 1, "set": 1, "hit": 1})
+        self.assertEqual(response.data["latency"]["measurement"]["get"]["count"], 2)
+        # LocMemCache не использует сериализатор Redis, размер не измеряется
+        self.assertNotIn("measurement", response.data["sizes"])
+
+        response = self.client.get(self.url_prometheus, headers=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('bood_cache_events_total{prefix="measurement",event="hit"} 1', response.content.decode())
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_invalidation_prefixes(self) -> None:
+        """
+        Инвалидация считается под теми же префиксами, что и попадания
+        """
+        cache_metrics.clear()
+        set_new_cache_generations({("calculate", 1), ("recommendation", 1), ("eating", 1)})
+        counters = cache_metrics.snapshot()["counters"]
+        for prefixes in NAMESPACE_METRIC_PREFIXES.values():
+            for prefix in prefixes:
+                self.assertEqual(counters[prefix]["invalidation"], 1)
+        self.assertEqual(counters["eating"]["invalidation"], 1)
+        self.assertNotIn("calculate", counters)
+
+    def test_get_compression(self) -> None:
+        """
+        Объем данных до и после сжатия и коэффициент сжатия видны в метриках
+        """
+        compression_stats.clear()
+        CompressedRedisSerializer().dumps({"results": [{"question": f"Question {i}"} for i in range(500)]})
+        stats = compression_stats.snapshot()
+
+        response = self.client.get(self.url, headers=self.token)
+        self.assertEqual(response.data["compression"], stats)
+        self.assertGreater(response.data["compression"]["ratio"], 1.0)
+
+        content = self.client.get(self.url_prometheus, headers=self.token).content.decode()
+        self.assertIn('bood_cache_serialized_values_total{compressed="true"} 1', content)
+        self.assertIn(f'bood_cache_serialized_bytes_total{{stage="raw"}} {stats["raw_bytes"]}', content)
+        self.assertIn(f'bood_cache_serialized_bytes_total{{stage="stored"}} {stats["stored_bytes"]}', content)
+        self.assertIn(f"bood_cache_compression_ratio {stats['ratio']}", content)
+
+    def test_get_invalid_not_staff(self) -> None:
+        Person.objects.create_user(email="user@user.com", password="12345")
+        response = self.client.post(reverse("jwt-create"), {"email": "user@user.com", "password": "12345"})
+        token = {"Authorization": f"JWT {response.data['access']}"}
+        response = self.client.get(self.url, headers=token)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(self.url_prometheus, headers=token)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class HistogramTestCase(SimpleTestCase):
+    def test_buckets(self) -> None:
+        metrics = CacheMetrics()
+        metrics.observe_latency("eating", "get", 0.001)
+        metrics.observe_latency("eating", "get", 10.0)
+        histogram = metrics.snapshot()["latency"]["eating"]["get"]
+        self.assertEqual(histogram["buckets"]["0.0005"], 0)
+        self.assertEqual(histogram["buckets"]["0.001"], 1)
+        self.assertEqual(histogram["buckets"]["2.5"], 1)
+        self.assertEqual(histogram["buckets"]["+Inf"], 2)
+        self.assertEqual(histogram["count"], 2)
+
+
+class StoredSizeTestCase(SimpleTestCase):
+    def test_size_from_serializer(self) -> None:
+        """
+        Размер берется из сериализатора: это сжатые байты, которые записываются в кэш
+        """
+        serializer = CompressedRedisSerializer()
+        pop_stored_size()
+        small = serializer.dumps({"calories": 1})
+        self.assertEqual(pop_stored_size(), len(small))
+        self.assertIsNone(pop_stored_size())
+        large = serializer.dumps({"results": [{"question": f"Question {i}"} for i in range(500)]})
+        self.assertEqual(pop_stored_size(), len(large))
+
+    def test_observe_size(self) -> None:
+        metrics = CacheMetrics()
+        metrics.observe_size("faq", 100)
+        self.assertEqual(metrics.snapshot()["sizes"]["faq"]["count"], 1)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_set_cache_value_without_serializer(self) -> None:
+        cache_metrics.clear()
+        set_cache_value("size_test", {"calories": 1}, 10, "faq")
+        snapshot = cache_metrics.snapshot()
+        self.assertEqual(snapshot["counters"]["faq"]["set"], 1)
+        self.assertNotIn("faq", snapshot["sizes"])
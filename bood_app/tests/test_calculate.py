@@ -1,8 +1,26 @@
+import datetime
+import threading
+import time
+
+from django.core.cache import cache
+from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 
-from bood_app.models import PersonCard, Measurement
+from bood_app.models import PersonCard, Measurement, ProductWeight, Eating
+from bood_app.services.calculate import CalculateService, get_eaten_nutrients
+from bood_app.services.product_catalog import ProductCatalog
 from bood_app.tests.base_classes import BaseInitTestCase
+from bood_app.utils.cache import (
+    CACHE_LOCK_WAIT,
+    bump_cache_generation,
+    finish_cache_invalidation_batch,
+    get_cache_generation,
+    get_calculate_cache_name,
+    get_or_set_single_flight,
+    start_cache_invalidation_batch,
+)
 
 
 class CalculateTestCase(BaseInitTestCase):
@@ -11,6 +29,7 @@ class CalculateTestCase(BaseInitTestCase):
         self.token = self.get_authorization(1)
         self.url_standard = reverse("standard")
         self.url_current = reverse("current")
+        self.url_current_range = reverse("current_range")
 
     def test_get_valid_standard_male(self) -> None:
         standard_data = {
@@ -93,3 +112,209 @@ class CalculateTestCase(BaseInitTestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data["status"], "400")
         self.assertEqual(response.data["error"], "Measurements not found")
+
+    def test_current_query_count_does_not_grow(self) -> None:
+        service = CalculateService(self.person_card1, timezone.now().date())
+
+        def grow() -> None:
+            for _ in range(30):
+                product_weight = ProductWeight.objects.create(weight=50, product=self.product1)
+                Eating.objects.create(product_weight=product_weight, person_card=self.person_card1)
+                Eating.objects.create(recipe=self.recipe, person_card=self.person_card1)
+
+        _, current = self.assertQueryCountStable(service.get_current, grow)
+        self.assertEqual(current["calories"], round(497 + 30 * (0.41 * 50 + 497)))
+
+    def test_eaten_nutrients_from_catalog(self) -> None:
+        Eating.objects.create(recipe=self.recipe, person_card=self.person_card1)
+        today = timezone.now().date()
+        catalog = ProductCatalog.load()
+        self.assertEqual(len(catalog), 3)
+        self.assertEqual(catalog.get(self.product1.id, "calories"), 0.41)
+        self.assertEqual(catalog.get_category(self.product1.id), self.category1.id)
+
+        from_db = get_eaten_nutrients(self.person_card1.id, today)
+        from_catalog = get_eaten_nutrients(self.person_card1.id, today, catalog)
+        for nutrient, value in from_db.items():
+            self.assertAlmostEqual(from_catalog[nutrient], value)
+
+    def test_recipe_product_eaten_separately(self) -> None:
+        """
+        Продукт рецепта, съеденного в тот же день, учитывается один раз в сумме рецепта
+        """
+        today = timezone.now().date()
+        catalog = ProductCatalog.load()
+        self.assertAlmostEqual(get_eaten_nutrients(self.person_card1.id, today)["calories"], 497)
+        self.assertAlmostEqual(get_eaten_nutrients(self.person_card1.id, today, catalog)["calories"], 497)
+
+        Eating.objects.filter(pk=self.eating2.pk).update(datetime_add=timezone.now() - datetime.timedelta(days=1))
+        self.assertAlmostEqual(get_eaten_nutrients(self.person_card1.id, today)["calories"], 238)
+        self.assertAlmostEqual(get_eaten_nutrients(self.person_card1.id, today, catalog)["calories"], 238)
+
+    def test_get_valid_current_range(self) -> None:
+        today = timezone.now().date()
+        yesterday = today - datetime.timedelta(days=1)
+        product_weight = ProductWeight.objects.create(weight=100, product=self.product1)
+        eating = Eating.objects.create(product_weight=product_weight, person_card=self.person_card1)
+        Eating.objects.filter(pk=eating.pk).update(datetime_add=eating.datetime_add - datetime.timedelta(days=1))
+        Measurement.objects.filter(person_card=self.person_card1).update(
+            datetime_add=timezone.now() - datetime.timedelta(days=1)
+        )
+        Measurement.objects.create(weight=90, chest=100, waist=70, hips=90, hand=16, person_card=self.person_card1)
+
+        url = f"{self.url_current_range}?from={yesterday}&to={today}"
+        response = self.client.get(url, headers=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        days = response.data["detail"]["days"]
+        self.assertEqual([day["date"] for day in days], [str(yesterday), str(today)])
+        for day in days:
+            date = datetime.date.fromisoformat(day["date"])
+            current = get_eaten_nutrients(self.person_card1.id, date)
+            self.assertEqual(day["current"], {nutrient: round(value) for nutrient, value in current.items()})
+            self.assertEqual(day["standard"], CalculateService(self.person_card1, date).get_standard())
+        self.assertEqual(days[0]["current"]["calories"], 41)
+        self.assertEqual(days[0]["standard"]["water"], 2400)
+        self.assertEqual(days[1]["standard"]["water"], 2700)
+
+    def test_get_current_range_before_measurements(self) -> None:
+        today = timezone.now().date()
+        url = f"{self.url_current_range}?from={today - datetime.timedelta(days=2)}&to={today}"
+        response = self.client.get(url, headers=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        days = response.data["detail"]["days"]
+        self.assertEqual(len(days), 3)
+        self.assertIsNone(days[0]["standard"])
+        self.assertEqual(days[0]["current"]["calories"], 0)
+
+    def test_get_invalid_current_range(self) -> None:
+        url = f"{self.url_current_range}?from=2024-02-10&to=2024-02-01"
+        response = self.client.get(url, headers=self.token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["error"], "Invalid date range")
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_current_cache_by_date(self) -> None:
+        cache.clear()
+        yesterday = timezone.now().date() - datetime.timedelta(days=1)
+        Measurement.objects.filter(person_card=self.person_card1).update(
+            datetime_add=timezone.now() - datetime.timedelta(days=1)
+        )
+        response_today = self.client.get(self.url_current, headers=self.token)
+        response_yesterday = self.client.get(f"{self.url_current}?date={yesterday}", headers=self.token)
+        self.assertEqual(response_today.data["detail"]["calories"], 497)
+        self.assertEqual(response_yesterday.data["detail"]["calories"], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product_weight = ProductWeight.objects.create(weight=100, product=self.product1)
+            Eating.objects.create(product_weight=product_weight, person_card=self.person_card1)
+        response_today = self.client.get(self.url_current, headers=self.token)
+        self.assertEqual(response_today.data["detail"]["calories"], 538)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_stale_calculate_cache_does_not_survive(self) -> None:
+        cache.clear()
+        today = timezone.now().date()
+        cache_name = get_calculate_cache_name("current", self.person1.id, today)
+        with self.captureOnCommitCallbacks(execute=True):
+            Measurement.objects.create(weight=90, chest=100, waist=70, hips=90, hand=16, person_card=self.person_card1)
+        get_or_set_single_flight(cache_name, lambda: {"calories": 1}, 60)
+
+        new_cache_name = get_calculate_cache_name("current", self.person1.id, today)
+        self.assertNotEqual(new_cache_name, cache_name)
+        self.assertIsNone(cache.get(new_cache_name))
+        self.assertEqual(new_cache_name, get_calculate_cache_name("current", self.person1.id, today))
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_cache_invalidation_batch(self) -> None:
+        cache.clear()
+        generation = get_cache_generation("eating", self.person1.id)
+        start_cache_invalidation_batch()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            bump_cache_generation("eating", self.person1.id)
+            bump_cache_generation("eating", self.person1.id)
+        self.assertEqual(len(callbacks), 2)
+        self.assertEqual(get_cache_generation("eating", self.person1.id), generation)
+        finish_cache_invalidation_batch()
+        self.assertNotEqual(get_cache_generation("eating", self.person1.id), generation)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_single_flight(self) -> None:
+        cache.clear()
+        calls = []
+
+        def compute() -> dict:
+            calls.append(1)
+            return {"calories": len(calls)}
+
+        self.assertEqual(get_or_set_single_flight("single_flight", compute, 60), {"calories": 1})
+        self.assertEqual(get_or_set_single_flight("single_flight", compute, 60), {"calories": 1})
+        self.assertEqual(len(calls), 1)
+
+        # Пока значение пересчитывает другой процесс, возвращается предыдущее
+        cache.set("single_flight", {"value": {"calories": 0}, "delta": 0.0, "expiry": 0.0}, 60)
+        cache.add("lock_single_flight", 1, 60)
+        self.assertEqual(get_or_set_single_flight("single_flight", compute, 60), {"calories": 0})
+        self.assertEqual(len(calls), 1)
+
+        cache.delete("lock_single_flight")
+        self.assertEqual(get_or_set_single_flight("single_flight", compute, 60), {"calories": 2})
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_single_flight_lock_released_without_value(self) -> None:
+        cache.clear()
+        locked = threading.Event()
+
+        def failing_compute() -> dict:
+            locked.set()
+            time.sleep(0.2)
+            raise ValueError
+
+        def hold_lock() -> None:
+            with self.assertRaises(ValueError):
+                get_or_set_single_flight("single_flight", failing_compute, 60)
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        locked.wait()
+        start = time.monotonic()
+        # Ожидающий не спит весь CACHE_LOCK_WAIT, а сам берет освобожденную блокировку
+        self.assertEqual(get_or_set_single_flight("single_flight", lambda: {"calories": 3}, 60), {"calories": 3})
+        self.assertLess(time.monotonic() - start, CACHE_LOCK_WAIT)
+        holder.join()
+        self.assertEqual(cache.get("single_flight")["value"], {"calories": 3})
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_single_flight_keeps_lock_of_other_owner(self) -> None:
+        cache.clear()
+
+        def slow_compute() -> dict:
+            # Блокировка истекла во время расчета и досталась другому обработчику
+            cache.set("lock_single_flight", "other", 60)
+            return {"calories": 4}
+
+        self.assertEqual(get_or_set_single_flight("single_flight", slow_compute, 60), {"calories": 4})
+        self.assertEqual(cache.get("lock_single_flight"), "other")
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_delete_invalidates_current_cache(self) -> None:
+        cache.clear()
+        response = self.client.get(self.url_current, headers=self.token)
+        self.assertEqual(response.data["detail"]["calories"], 497)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse("eating-detail", args=(self.eating1.id,)), headers=self.token)
+        response = self.client.get(self.url_current, headers=self.token)
+        self.assertLess(response.data["detail"]["calories"], 497)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_bulk_update_invalidates_dependent_caches(self) -> None:
+        cache.clear()
+        generations = {
+            namespace: get_cache_generation(namespace, self.person1.id)
+            for namespace in ("measurement", "calculate", "person_card", "eating")
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            Measurement.objects.filter(person_card=self.person_card1).update(weight=80)
+        for namespace in ("measurement", "calculate", "person_card"):
+            self.assertNotEqual(get_cache_generation(namespace, self.person1.id), generations[namespace])
+        self.assertEqual(get_cache_generation("eating", self.person1.id), generations["eating"])
@@ -0,0 +1,100 @@
+import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bood_app.models import DailyIntake, Eating, Product, ProductWeight
+from bood_app.services.calculate import get_eaten_nutrients, refresh_daily_intakes
+from bood_app.tests.base_classes import BaseInitTestCase
+
+
+class DailyIntakeTestCase(BaseInitTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.date = timezone.now().date()
+
+    def get_daily_intake(self) -> DailyIntake:
+        return DailyIntake.objects.get(person_card=self.person_card1, date=self.date)
+
+    def test_model(self) -> None:
+        daily_intake = self.get_daily_intake()
+        self.assertEqual(str(daily_intake), f"{self.person_card1.id}: {self.date}")
+
+    def test_create_eating(self) -> None:
+        calories = self.get_daily_intake().calories
+        product_weight = ProductWeight.objects.create(weight=100, product=self.product1)
+        Eating.objects.create(product_weight=product_weight, person_card=self.person_card1)
+        self.assertAlmostEqual(self.get_daily_intake().calories, calories + 41)
+
+    def test_delete_eating(self) -> None:
+        self.eating3.delete()
+        self.assertEqual(self.get_daily_intake().water, get_eaten_nutrients(self.person_card1.id, self.date)["water"])
+        self.eating2.delete()
+        self.eating1.delete()
+        daily_intake = self.get_daily_intake()
+        self.assertEqual(daily_intake.calories, 0.0)
+        self.assertEqual(daily_intake.water, 0.0)
+
+    def test_change_product_nutrients(self) -> None:
+        """
+        Изменение КБЖУ продукта пересчитывает суммы рецептов и сводки за дни, когда он был съеден
+        """
+        self.product3.calories = 3.0
+        self.product3.save()
+        self.recipe.refresh_from_db()
+        self.assertAlmostEqual(self.recipe.calories, 238 + 300)
+        self.assertAlmostEqual(self.get_daily_intake().calories, 238 + 300)
+        call_command("rebuild_recipe_nutrients", verify=True, stdout=StringIO())
+        call_command("rebuild_daily_intake", verify=True, stdout=StringIO())
+
+    def test_save_product_without_nutrient_changes(self) -> None:
+        product = Product.objects.get(pk=self.product3.pk)
+        product.title = "Батон нарезной"
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+        self.assertFalse([query for query in queries if "dailyintake" in query["sql"]])
+
+        product.fats = 0.05
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+        self.assertTrue([query for query in queries if "dailyintake" in query["sql"]])
+
+    def test_refresh_daily_intakes_query_count(self) -> None:
+        eatings = Eating.objects.filter(person_card=self.person_card1)
+
+        def grow() -> None:
+            for days in range(1, 6):
+                product_weight = ProductWeight.objects.create(weight=100, product=self.product1)
+                eating = Eating.objects.create(product_weight=product_weight, person_card=self.person_card1)
+                Eating.objects.filter(pk=eating.pk).update(datetime_add=eating.datetime_add - datetime.timedelta(days))
+            refresh_daily_intakes(eatings)
+            DailyIntake.objects.filter(person_card=self.person_card1).update(calories=0.0)
+
+        _, count = self.assertQueryCountStable(lambda: refresh_daily_intakes(eatings), grow)
+        self.assertEqual(count, 6)
+        call_command("rebuild_daily_intake", verify=True, stdout=StringIO())
+
+    def test_change_recipe_product_weight(self) -> None:
+        self.productweight2.weight = 200
+        self.productweight2.save()
+        self.assertAlmostEqual(self.get_daily_intake().calories, 238 + 518)
+        call_command("rebuild_daily_intake", verify=True, stdout=StringIO())
+
+    def test_delete_person_card(self) -> None:
+        self.person_card1.delete()
+        self.assertFalse(DailyIntake.objects.exists())
+
+    def test_command_verify_and_rebuild(self) -> None:
+        DailyIntake.objects.filter(person_card=self.person_card1).update(calories=0.0)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_daily_intake", verify=True, stdout=StringIO())
+
+        call_command("rebuild_daily_intake", stdout=StringIO())
+        call_command("rebuild_daily_intake", verify=True, stdout=StringIO())
+        self.assertAlmostEqual(
+            self.get_daily_intake().calories, get_eaten_nutrients(self.person_card1.id, self.date)["calories"]
+        )
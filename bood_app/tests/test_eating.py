@@ -1,9 +1,13 @@
 from django.contrib.admin import AdminSite
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 
 from bood_app.admin import EatingAdmin
-from bood_app.models import Eating
+from bood_app.models import DailyIntake, Eating, ProductWeight, Recipe, Water
+from bood_app.services.calculate import get_eaten_nutrients
 from bood_app.tests.base_classes import BaseInitTestCase
 
 
@@ -14,6 +18,94 @@ class EatingTestCase(BaseInitTestCase):
         self.url = reverse("eating-list")
         self.url_detail = reverse("eating-detail", args=(self.eating1.id,))
 
+    def test_list_query_count_does_not_grow(self) -> None:
+        def grow() -> None:
+            recipe = Recipe.objects.create(title="Салат", person_card=self.person_card1)
+            ProductWeight.objects.create(weight=50, product=self.product1, recipe=recipe)
+            for _ in range(5):
+                product_weight = ProductWeight.objects.create(weight=100, product=self.product3)
+                Eating.objects.create(product_weight=product_weight, person_card=self.person_card1)
+                Eating.objects.create(recipe=recipe, person_card=self.person_card1)
+                Eating.objects.create(water=Water.objects.create(weight=200), person_card=self.person_card1)
+
+        _, response = self.assertQueryCountStable(self.url, grow, headers=self.token)
+        self.assertEqual(response.data["count"], 18)
+
+    def test_post_bulk_valid(self) -> None:
+        url = reverse("eating-bulk")
+        data = [
+            {"product_weight": {"product": self.product1.id, "weight": 100}},
+            {"recipe": self.recipe.id},
+            {"water": {"weight": 300}},
+        ]
+        response, _ = self.assertQueryCountStable(
+            lambda: self.client.post(url, data, headers=self.token, format="json"),
+            action_after_grow=lambda: self.client.post(url, data * 10, headers=self.token, format="json"),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["detail"]), 3)
+        self.assertEqual(response.data["detail"][0]["product_weight"]["product"], self.product1.id)
+        self.assertEqual(response.data["detail"][1]["recipe"], self.recipe.id)
+        self.assertEqual(response.data["detail"][2]["water"]["weight"], 300)
+        self.assertEqual(Eating.objects.filter(person_card=self.person_card1).count(), 36)
+        daily_intake = DailyIntake.objects.get(person_card=self.person_card1, date=timezone.now().date())
+        self.assertEqual(daily_intake.water, get_eaten_nutrients(self.person_card1.id, timezone.now().date())["water"])
+
+    def test_post_bulk_invalid(self) -> None:
+        data = [
+            {"water": {"weight": 300}},
+            {"water": {"weight": 300}, "recipe": self.recipe.id},
+            {"product_weight": {"product": 100500, "weight": 100}},
+        ]
+        response = self.client.post(reverse("eating-bulk"), data, headers=self.token, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.data["error"]), 3)
+        self.assertFalse(response.data["error"][0])
+        self.assertTrue(response.data["error"][1])
+        self.assertTrue(response.data["error"][2])
+        self.assertEqual(Eating.objects.filter(person_card=self.person_card1).count(), 3)
+
+    def test_get_cursor_pages(self) -> None:
+        eatings = Eating.objects.filter(person_card=self.person_card1).order_by("-datetime_add", "-id")
+        expected = list(eatings.values_list("id", flat=True))
+        response = self.client.get(self.url, {"cursor": "", "limit": 2}, headers=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        self.assertEqual(len(response.data["results"]), 2)
+        next_page = self.client.get(response.data["next"], headers=self.token)
+        self.assertEqual(next_page.status_code, status.HTTP_200_OK)
+        self.assertIsNone(next_page.data["next"])
+        ids = [item["id"] for item in response.data["results"] + next_page.data["results"]]
+        self.assertEqual(ids, expected)
+
+        response = self.client.get(self.url, {"limit": 2, "offset": 1}, headers=self.token)
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual([item["id"] for item in response.data["results"]], expected[::-1][1:])
+
+    def test_get_sparse_fields(self) -> None:
+        with CaptureQueriesContext(connection) as full:
+            self.client.get(self.url, headers=self.token)
+        with CaptureQueriesContext(connection) as sparse:
+            response = self.client.get(self.url, {"fields": "id,datetime_add,recipe", "expand": ""}, headers=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = {item["id"]: item for item in response.data["results"]}
+        self.assertEqual(set(results[self.eating2.id]), {"id", "datetime_add", "recipe"})
+        self.assertEqual(results[self.eating2.id]["recipe"], self.recipe.id)
+        self.assertLess(len(sparse), len(full))
+
+    def test_get_nested_expand(self) -> None:
+        url = reverse("eating-detail", args=(self.eating2.id,))
+        response = self.client.get(url, {"expand": "recipe"}, headers=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["recipe"]["title"], self.recipe.title)
+        self.assertEqual(response.data["recipe"]["product_weight"][0]["product"], self.product2.id)
+
+        response = self.client.get(url, {"expand": "recipe.product_weight"}, headers=self.token)
+        self.assertEqual(response.data["recipe"]["product_weight"][0]["product"]["title"], self.product2.title)
+
+        response = self.client.get(self.url_detail, {"expand": ""}, headers=self.token)
+        self.assertEqual(response.data["product_weight"]["product"], self.product2.id)
+
     def test_model(self) -> None:
         self.assertEqual(str(self.eating1), self.eating1.person_card.person.email)
         self.assertEqual(str(self.productweight1), self.productweight1.product.title)
@@ -50,6 +142,15 @@ class EatingTestCase(BaseInitTestCase):
         self.assertFalse(response.data["detail"]["recipe"])
         self.assertFalse(response.data["detail"]["water"])
 
+    def test_post_refreshes_daily_intake_once(self) -> None:
+        data = {"water": {"weight": 200}}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, data, headers=self.token, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        writes = [query for query in queries if "dailyintake" in query["sql"] and query["sql"].startswith("UPDATE")]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(len([query for query in queries if query["sql"].startswith("UPDATE")]), 1)
+
     def test_post_valid_recipe(self) -> None:
         data = {"recipe": 1}
         response = self.client.post(self.url, data, headers=self.token, format="json")
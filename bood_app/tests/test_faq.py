@@ -1,6 +1,11 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
+from bood_app.models import FAQ
 from bood_app.tests.base_classes import BaseInitTestCase
+from bood_app.utils.cache import LocalCache, reference_local_cache, reference_local_versions
+from bood_app.utils.cache_serializer import CompressedRedisSerializer, compression_stats
 
 
 class FAQTestCase(BaseInitTestCase):
@@ -16,3 +21,53 @@ class FAQTestCase(BaseInitTestCase):
         response = self.client.get(self.url, headers=self.token)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue(response.data["results"][0]["question"])
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_get_cached_reference(self) -> None:
+        cache.clear()
+        reference_local_cache.clear()
+        reference_local_versions.clear()
+        response = self.client.get(self.url, headers=self.token)
+        self.assertEqual(response.data["count"], 1)
+
+        FAQ.objects.create(question="Question 2", answer="Answer 2")
+        response = self.client.get(self.url, headers=self.token)
+        self.assertEqual(response.data["count"], 2)
+
+        FAQ.objects.filter(question="Question 2").delete()
+        response = self.client.get(self.url, headers=self.token)
+        self.assertEqual(response.data["count"], 1)
+
+
+class LocalCacheTestCase(SimpleTestCase):
+    def test_lru(self) -> None:
+        local_cache = LocalCache(2, 60)
+        local_cache.set("a", 1)
+        local_cache.set("b", 2)
+        self.assertEqual(local_cache.get("a"), 1)
+        local_cache.set("c", 3)
+        self.assertIsNone(local_cache.get("b"))
+        self.assertEqual(local_cache.get("a"), 1)
+        self.assertEqual(local_cache.get("c"), 3)
+
+    def test_timeout(self) -> None:
+        local_cache = LocalCache(2, -1)
+        local_cache.set("a", 1)
+        self.assertIsNone(local_cache.get("a"))
+
+
+class CompressedRedisSerializerTestCase(SimpleTestCase):
+    def test_round_trip(self) -> None:
+        serializer = CompressedRedisSerializer()
+        compression_stats.clear()
+        small = {"count": 1, "results": [{"question": "Question"}]}
+        large = {"count": 500, "results": [{"question": f"Question {i}", "answer": "Answer"} for i in range(500)]}
+        self.assertEqual(serializer.loads(serializer.dumps(small)), small)
+        self.assertEqual(serializer.loads(serializer.dumps(large)), large)
+        self.assertEqual(serializer.loads(serializer.dumps(1)), 1)
+        self.assertEqual(serializer.dumps(1), 1)
+
+        stats = compression_stats.snapshot()
+        self.assertEqual(stats["values"], 2)
+        self.assertEqual(stats["compressed"], 1)
+        self.assertGreater(stats["ratio"], 1.0)
@@ -1,5 +1,8 @@
+from django.core.cache import cache
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
+from bood_app.models import Measurement
 from bood_app.tests.base_classes import BaseInitTestCase
 
 
@@ -18,6 +21,56 @@ class MeasurementTestCase(BaseInitTestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue(response.data["results"][0]["weight"])
 
+    def test_get_cursor_page(self) -> None:
+        measurement = Measurement.objects.create(
+            weight=81, chest=100, waist=70, hips=90, hand=16, person_card=self.person_card1
+        )
+        response = self.client.get(self.url, {"cursor": "", "limit": 1}, headers=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        self.assertEqual(response.data["results"][0]["id"], measurement.id)
+        next_page = self.client.get(response.data["next"], headers=self.token)
+        self.assertEqual(next_page.data["results"][0]["id"], self.measurement.id)
+        self.assertIsNone(next_page.data["next"])
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_get_cached_page(self) -> None:
+        cache.clear()
+        response = self.client.get(f"{self.url}?limit=1", headers=self.token)
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(len(response.data["results"]), 1)
+
+        data = {"weight": 80, "chest": 100, "waist": 70, "hips": 90, "hand": 16}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.url, data, headers=self.token, format="json")
+        response = self.client.get(f"{self.url}?limit=1", headers=self.token)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(len(response.data["results"]), 1)
+        response = self.client.get(f"{self.url}?limit=1&offset=1", headers=self.token)
+        self.assertEqual(len(response.data["results"]), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(self.url_detail, headers=self.token)
+        response = self.client.get(f"{self.url}?limit=1", headers=self.token)
+        self.assertEqual(response.data["count"], 1)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_get_not_modified(self) -> None:
+        cache.clear()
+        response = self.client.get(self.url, headers=self.token)
+        etag = response["ETag"]
+
+        # Единственный запрос - загрузка пользователя при аутентификации
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, headers={**self.token, "If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.url_detail, {"weight": 80}, headers=self.token, format="json")
+        response = self.client.get(self.url, headers={**self.token, "If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
     def test_get_detail_valid(self) -> None:
         response = self.client.get(self.url_detail, headers=self.token)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -1,5 +1,10 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
+from bood_app.models import Measurement
 from bood_app.tests.base_classes import BaseInitTestCase
 
 
@@ -18,6 +23,49 @@ class PersonCardTestCase(BaseInitTestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertTrue(response.data["results"][0]["height"])
 
+    def test_list_query_count_does_not_grow(self) -> None:
+        def grow() -> None:
+            self.person_card1.exclude_products.add(self.product1, self.product2, self.product3)
+            self.person_card1.exclude_category.add(self.category1, self.category2)
+            for _ in range(5):
+                Measurement.objects.create(
+                    weight=80, chest=100, waist=70, hips=90, hand=16, person_card=self.person_card1
+                )
+
+        _, response = self.assertQueryCountStable(self.url, grow, headers=self.token)
+        self.assertEqual(len(response.data["results"][0]["exclude_products"]), 3)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_get_cached_after_person_change(self) -> None:
+        cache.clear()
+        response = self.client.get(self.url, headers=self.token)
+        self.assertEqual(response.data["results"][0]["person"]["email"], self.person1.email)
+
+        self.person1.email = "new@admin.com"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.person1.save()
+        response = self.client.get(self.url, headers=self.token)
+        self.assertEqual(response.data["results"][0]["person"]["email"], "new@admin.com")
+
+    def test_get_sparse_fields(self) -> None:
+        with CaptureQueriesContext(connection) as full:
+            self.client.get(self.url, headers=self.token)
+        with CaptureQueriesContext(connection) as sparse:
+            response = self.client.get(self.url, {"fields": "id,age,person"}, headers=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data["results"][0]), {"id", "age", "person"})
+        self.assertEqual(response.data["results"][0]["person"]["email"], self.person1.email)
+        self.assertLess(len(sparse), len(full))
+
+    def test_get_expand(self) -> None:
+        response = self.client.get(self.url, {"expand": "femaletype"}, headers=self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        card = response.data["results"][0]
+        self.assertEqual(card["femaletype"][0]["title"], self.femaletype.title)
+        self.assertEqual(card["exclude_category"], [self.category2.id])
+        self.assertEqual(card["measurements"], [self.measurement.id])
+        self.assertEqual(card["person"], self.person1.id)
+
     def test_post_valid(self) -> None:
         data = {
             "height": 175,
@@ -1,8 +1,15 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 
 from bood_app.models import Vitamin, MicroElement
 from bood_app.tests.base_classes import BaseInitTestCase
+from bood_app.utils.cache import get_reference_version, reference_local_cache, reference_local_versions
+from bood_app.utils.views.list_cache import get_reference_list_key
 
 
 class ProductTestCase(BaseInitTestCase):
@@ -32,3 +39,37 @@ class ProductTestCase(BaseInitTestCase):
         self.product1.delete()
         self.assertFalse(Vitamin.objects.filter(id=1))
         self.assertFalse(MicroElement.objects.filter(id=1))
+
+    def test_reference_list_key(self) -> None:
+        self.assertEqual(get_reference_list_key(" Хлеб  курица", 10, 0), get_reference_list_key("курица,хлеб", 10, 0))
+        self.assertNotEqual(get_reference_list_key("хлеб", 10, 0), get_reference_list_key("хлеб", 10, 10))
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_warm_reference_cache(self) -> None:
+        cache.clear()
+        reference_local_cache.clear()
+        reference_local_versions.clear()
+        call_command("warm_reference_cache", pages=1, stdout=StringIO())
+
+        # Страница общая для всех пользователей, остается только загрузка пользователя при аутентификации
+        for person_id in (1, 2):
+            token = self.get_authorization(person_id)
+            with self.assertNumQueries(1):
+                response = self.client.get(self.url, headers=token)
+            self.assertEqual(response.data["count"], 3)
+            self.assertIsNone(response.data["next"])
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_change_category_reset_products(self) -> None:
+        cache.clear()
+        reference_local_cache.clear()
+        reference_local_versions.clear()
+        product_version = get_reference_version("product")
+
+        self.category1.title = "Зелень"
+        self.category1.save()
+        self.assertNotEqual(get_reference_version("product"), product_version)
+
+    def test_get_unauthorized_products(self) -> None:
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
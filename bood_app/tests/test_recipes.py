@@ -1,5 +1,12 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
+
+from bood_app.models import ProductWeight, Recipe
 from bood_app.tests.base_classes import BaseInitTestCase
 
 
@@ -47,6 +54,10 @@ class RecipeTestCase(BaseInitTestCase):
         self.assertEqual(response.data["detail"]["description"], data["description"])
         self.assertEqual(response.data["detail"]["image"], data["image"])
         self.assertEqual(response.data["detail"]["product_weight"], data["product_weight"])
+        self.assertEqual(response.data["detail"]["weight"], 120)
+        self.assertAlmostEqual(
+            response.data["detail"]["calories"], self.product1.calories * 40 + self.product2.calories * 80
+        )
 
     def test_post_valid_identical_product(self) -> None:
         data = {
@@ -100,3 +111,81 @@ class RecipeTestCase(BaseInitTestCase):
     def test_delete_valid(self) -> None:
         response = self.client.delete(self.url_detail, headers=self.token)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_patch_eaten_recipe_creates_version(self) -> None:
+        data = {"product_weight": [{"product": 1, "weight": 20}]}
+        response = self.client.patch(self.url_detail, data, headers=self.token, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.is_active)
+        self.assertEqual(self.recipe.product_weight.count(), 2)
+        new_recipe = Recipe.objects.get(person_card=self.person_card1, is_active=True)
+        self.assertEqual(new_recipe.title, self.recipe.title)
+        self.assertEqual(list(new_recipe.product_weight.values_list("product_id", "weight")), [(1, 20)])
+
+    def test_patch_recipe_in_place(self) -> None:
+        self.eating2.delete()
+        productweight_ids = list(self.recipe.product_weight.order_by("id").values_list("id", flat=True))
+        data = {
+            "title": "TestPatch",
+            "product_weight": [
+                {"product": self.product2.id, "weight": 100},
+                {"product": self.product3.id, "weight": 50},
+                {"product": 1, "weight": 30},
+            ],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.url_detail, data, headers=self.token, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["detail"]["product_weight"], data["product_weight"])
+        writes = [query for query in queries if query["sql"].startswith(("INSERT", "UPDATE", "DELETE"))]
+        self.assertEqual(len(writes), 3)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.is_active)
+        self.assertEqual(self.recipe.title, data["title"])
+        self.assertEqual(
+            list(self.recipe.product_weight.order_by("id").values_list("id", flat=True))[:2], productweight_ids
+        )
+
+    def test_patch_recipe_in_place_without_product_weight(self) -> None:
+        self.eating2.delete()
+        response = self.client.patch(self.url_detail, {"title": "TestPatch"}, headers=self.token, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, "TestPatch")
+        self.assertEqual(self.recipe.product_weight.count(), 2)
+
+    def test_patch_large_recipe_write_count(self) -> None:
+        recipe = Recipe.objects.create(title="Салат", person_card=self.person_card1)
+        ProductWeight.objects.bulk_create(
+            ProductWeight(weight=10, product=self.product1, recipe=recipe) for _ in range(40)
+        )
+        data = {"product_weight": [{"product": self.product1.id, "weight": 10}] * 39 + [{"product": 2, "weight": 20}]}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                reverse("recipes-detail", args=(recipe.id,)), data, headers=self.token, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        writes = [query for query in queries if query["sql"].startswith(("INSERT", "UPDATE", "DELETE"))]
+        self.assertEqual(len(writes), 2)
+        self.assertEqual(recipe.product_weight.filter(weight=20).count(), 1)
+
+    def test_nutrients_follow_product_weight(self) -> None:
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.weight, self.productweight1.weight + self.productweight2.weight)
+        self.assertAlmostEqual(
+            self.recipe.calories,
+            self.product2.calories * self.productweight1.weight + self.product3.calories * self.productweight2.weight,
+        )
+        self.productweight2.delete()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.weight, self.productweight1.weight)
+
+    def test_command_verify_and_rebuild(self) -> None:
+        Recipe.objects.filter(pk=self.recipe.pk).update(calories=0, weight=0)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_recipe_nutrients", verify=True, stdout=StringIO())
+        call_command("rebuild_recipe_nutrients", stdout=StringIO())
+        call_command("rebuild_recipe_nutrients", verify=True, stdout=StringIO())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.weight, self.productweight1.weight + self.productweight2.weight)
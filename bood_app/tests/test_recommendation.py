@@ -1,7 +1,17 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 
 from bood_app.models import Eating, ProductWeight
+from bood_app.services.product_index import ProductProportionIndex
+from bood_app.services.recommendation import RecommendationService
 from bood_app.tests.base_classes import BaseInitTestCase
 
 
@@ -126,3 +136,79 @@ class RecommendationTestCase(BaseInitTestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data["status"], "400")
         self.assertEqual(response.data["error"], "There are too low eating to make recommendations")
+
+    def test_include_query_count_does_not_grow(self) -> None:
+        date = timezone.now().date()
+        Eating.objects.create(recipe=self.recipe, person_card=self.person_card1)
+
+        def grow() -> None:
+            for _ in range(10):
+                Eating.objects.create(recipe=self.recipe, person_card=self.person_card1)
+            self.person_card1.exclude_products.add(self.product3)
+            self.person_card1.exclude_category.add(self.category4, self.category5)
+
+        _, products = self.assertQueryCountStable(
+            lambda: RecommendationService(self.person_card1, date).get_include_products(), grow
+        )
+        self.assertNotIn(self.product3.id, [product.id for product in products])
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_include_cache(self) -> None:
+        cache.clear()
+        Eating.objects.create(recipe=self.recipe, person_card=self.person_card1)
+        with CaptureQueriesContext(connection) as first_call:
+            first_response = self.client.get(self.url_include, headers=self.token)
+        with CaptureQueriesContext(connection) as cached_call:
+            cached_response = self.client.get(self.url_include, headers=self.token)
+        self.assertEqual(cached_response.data, first_response.data)
+        self.assertLess(len(cached_call), len(first_call))
+        self.assertEqual(cached_response.data["detail"]["products"][0]["id"], self.product1.id)
+        self.assertIn("category", cached_response.data["detail"]["products"][0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.person_card1.exclude_products.add(self.product1)
+        response = self.client.get(self.url_include, headers=self.token)
+        self.assertNotIn(self.product1.id, [product["id"] for product in response.data["detail"]["products"]])
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_exclude_cache_after_eating(self) -> None:
+        cache.clear()
+        Eating.objects.create(recipe=self.recipe, person_card=self.person_card1)
+        response = self.client.get(self.url_exclude, headers=self.token)
+        self.assertEqual(response.data["detail"]["product"]["id"], self.product2.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.person_card1.eating.all().delete()
+        response = self.client.get(self.url_exclude, headers=self.token)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_benchmark_command(self) -> None:
+        Eating.objects.create(recipe=self.recipe, person_card=self.person_card1)
+        out = StringIO()
+        call_command("benchmark_recommendation", self.person_card1.id, repeat=2, stdout=out)
+        self.assertIn("include: запросов", out.getvalue())
+        self.assertIn("exclude: запросов", out.getvalue())
+
+
+class ProductProportionIndexTestCase(SimpleTestCase):
+    def setUp(self) -> None:
+        rows = [
+            (1, 1, 1.0, 0.5, 4.0),
+            (2, 2, 2.0, 1.5, 0.0),
+            (3, 1, 2.5, None, 3.0),
+            (4, None, 2.1, 1.0, 1.0),
+            (5, 3, 3.5, 0.2, 2.0),
+            (6, 3, None, 0.1, 2.0),
+        ]
+        self.index = ProductProportionIndex(rows)
+
+    def test_find_nearest(self) -> None:
+        self.assertEqual(self.index.find_nearest("proteins_proportion", 2.2, 3, [], []), [2, 3, 1])
+        self.assertEqual(self.index.find_nearest("proteins_proportion", 2.2, 10, [3], [3]), [2, 1])
+        self.assertEqual(self.index.find_nearest("proteins_proportion", 10, 10, [], []), [5, 3, 2, 1, 6])
+
+    def test_order_by_distance(self) -> None:
+        self.assertEqual(self.index.order_by_distance([1, 2, 3, 5], "fats_proportion", 1.0), [1, 2, 5, 3])
+
+    def test_order_by_distance_tie(self) -> None:
+        self.assertEqual(self.index.order_by_distance([5, 2, 1], "carbohydrates_proportion", 1.0), [2, 5, 1])
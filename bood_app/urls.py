@@ -7,6 +7,7 @@ from .views import (
     EatingViewSet,
     StandardValuesView,
     CurrentValuesView,
+    CurrentRangeValuesView,
     MeasurementViewSet,
     RecipeViewSet,
     RecommendationIncludeView,
@@ -15,6 +16,8 @@ from .views import (
     ProductCategoryViewSet,
     FAQViewSet,
     ProductSearch,
+    CacheMetricsView,
+    CacheMetricsPrometheusView,
 )
 
 router = DefaultRouter()
@@ -31,7 +34,10 @@ urlpatterns = [
     path("", include(router.urls)),
     path("calculate/standard/", StandardValuesView.as_view(), name="standard"),
     path("calculate/current/", CurrentValuesView.as_view(), name="current"),
+    path("calculate/current/range/", CurrentRangeValuesView.as_view(), name="current_range"),
     path("recommendation/include", RecommendationIncludeView.as_view(), name="recommendation_include"),
     path("recommendation/exclude", RecommendationExcludeView.as_view(), name="recommendation_exclude"),
     path("products/elasticsearch/", ProductSearch.as_view(), name="product_elasticsearch"),
+    path("cache/metrics/", CacheMetricsView.as_view(), name="cache_metrics"),
+    path("cache/metrics/prometheus/", CacheMetricsPrometheusView.as_view(), name="cache_metrics_prometheus"),
 ]
@@ -1,32 +1,360 @@
+import datetime
+import hashlib
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Union
+
 from django.core.cache import cache
-from django.db import models
+from django.db import transaction
+from django.utils import timezone
+
+from bood_app.utils.cache_metrics import cache_metrics
+from bood_app.utils.cache_serializer import pop_stored_size
+
+CALCULATE_CACHE_TIMEOUT = 60 * 60 * 24
+CALCULATE_PAST_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+LIST_CACHE_TIMEOUT = 60 * 60 * 24
+PRODUCT_CATALOG_VERSION = "product_catalog_version"
+CACHE_LOCK_TIMEOUT = 30
+CACHE_LOCK_WAIT = 5
+CACHE_LOCK_POLL = 0.05
+CACHE_EARLY_REFRESH_BETA = 1.0
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+REFERENCE_LOCAL_MAXSIZE = 256
+REFERENCE_LOCAL_TIMEOUT = 60 * 5
+REFERENCE_VERSION_CHECK_TIMEOUT = 5
+REFERENCE_VERSIONS = {
+    "product": PRODUCT_CATALOG_VERSION,
+    "product_category": "product_category_version",
+    "female_type": "female_type_version",
+    "faq": "faq_version",
+}
+# Metric prefixes of caches stored under a user namespace, if they differ from the namespace
+NAMESPACE_METRIC_PREFIXES = {
+    "calculate": ("calculate_standard", "calculate_current"),
+    "recommendation": ("recommendation_include", "recommendation_exclude"),
+}
+
+
+def get_generation_name(namespace: str, user_id: int) -> str:
+    return f"generation_{namespace}_{user_id}"
+
+
+def get_cache_generation(namespace: str, user_id: int) -> str:
+    """
+    Return generation of user namespace, create it if not exists.
+    If cache can't keep generation, a new one is returned so that keys are never shared
+    """
+    generation_name = get_generation_name(namespace, user_id)
+    generation = cache.get(generation_name)
+    if generation is None:
+        cache.add(generation_name, uuid.uuid4().hex, None)
+        generation = cache.get(generation_name) or uuid.uuid4().hex
+    return generation
+
+
+_invalidation = threading.local()
+
+
+def start_cache_invalidation_batch() -> None:
+    """
+    Start collecting generation bumps of current thread, e.g. for request
+    """
+    _invalidation.generations = set()
+
+
+def finish_cache_invalidation_batch() -> None:
+    """
+    Write all collected generation bumps with one set_many
+    """
+    generations = getattr(_invalidation, "generations", None)
+    _invalidation.generations = None
+    if generations:
+        set_new_cache_generations(generations)
+
+
+def set_new_cache_generations(generations: set) -> None:
+    for namespace, _ in generations:
+        for prefix in NAMESPACE_METRIC_PREFIXES.get(namespace, (namespace,)):
+            cache_metrics.incr(prefix, "invalidation")
+    cache.set_many(
+        {get_generation_name(namespace, user_id): uuid.uuid4().hex for namespace, user_id in generations}, None
+    )
+
+
+def collect_cache_generation(namespace: str, user_id: int) -> None:
+    generations = getattr(_invalidation, "generations", None)
+    if generations is None:
+        set_new_cache_generations({(namespace, user_id)})
+    else:
+        generations.add((namespace, user_id))
 
 
-def delete_model_cache_for_current_user(prefix_cache: str, user_id: int) -> None:
-    cache.delete(f"{prefix_cache}_{user_id}")
+def bump_cache_generation(namespace: str, user_id: int) -> None:
+    """
+    Invalidate all keys of user namespace after transaction commit.
+    Inside a batch bumps are deduplicated and written once when the batch finishes
+    """
+    if user_id is None:
+        return
+    transaction.on_commit(lambda: collect_cache_generation(namespace, user_id))
+
+
+def get_user_cache_name(namespace: str, user_id: int, *parts) -> str:
+    """
+    Return key inside user namespace. Key contains current generation of namespace
+    """
+    generation = get_cache_generation(namespace, user_id)
+    return "_".join(str(part) for part in (namespace, user_id, generation, *parts))
+
+
+def get_cache_etag(cache_name: str) -> str:
+    """
+    Return strong ETag of cached data. Key changes with user generation, so does ETag
+    """
+    return f'"{hashlib.md5(cache_name.encode()).hexdigest()}"'
+
+
+def get_calculate_cache_name(calculate_type: str, user_id: int, date: datetime.date) -> str:
+    return get_user_cache_name("calculate", user_id, calculate_type, f"{date:%Y-%m-%d}")
 
 
-def get_calculate_standard_cache(user_id: int):
-    cache_name = f"calculate_standard_{user_id}"
-    standard_cache = cache.get(cache_name)
-    return standard_cache
+def get_calculate_cache_timeout(date: datetime.date) -> int:
+    """
+    Return timeout of calculate result for date. Past days are kept longer
+    """
+    is_past = datetime.date(date.year, date.month, date.day) < timezone.now().date()
+    return CALCULATE_PAST_CACHE_TIMEOUT if is_past else CALCULATE_CACHE_TIMEOUT
+
+
+def get_recommendation_cache_name(recommendation_type: str, user_id: int, date: datetime.date) -> str:
+    catalog_version = get_cache_version(PRODUCT_CATALOG_VERSION)
+    return get_user_cache_name("recommendation", user_id, recommendation_type, f"{date:%Y-%m-%d}", catalog_version)
+
+
+def is_early_refresh(entry: dict) -> bool:
+    """
+    Probabilistic early refresh: the closer the expiry and the longer the computation,
+    the more likely one of the readers recomputes the value before it expires
+    """
+    return time.time() - entry["delta"] * CACHE_EARLY_REFRESH_BETA * math.log(1.0 - random.random()) >= entry["expiry"]
+
+
+def set_cache_value(cache_name: str, value: Any, timeout: int, prefix: str) -> None:
+    """
+    Save value and record write metrics. Payload size is taken from the cache serializer,
+    so it is the compressed size actually stored and the value is not pickled twice
+    """
+    pop_stored_size()
+    with cache_metrics.timer(prefix, "set"):
+        cache.set(cache_name, value, timeout)
+    cache_metrics.incr(prefix, "set")
+    size = pop_stored_size()
+    if size is not None:
+        cache_metrics.observe_size(prefix, size)
 
 
-def get_calculate_current_cache(user_id: int):
-    cache_name = f"calculate_current_{user_id}"
-    current_cache = cache.get(cache_name)
-    return current_cache
+def get_or_set_single_flight(
+    cache_name: str, compute: Callable[[], Any], timeout: int, prefix: str = "single_flight"
+) -> Any:
+    """
+    Return cached value or compute it. Only the worker holding the lock computes the value,
+    the others return the previous value or wait for the new one. None results are not saved.
+    If the lock is released without a value (compute raised or returned None), waiters stop
+    waiting and one of them takes the lock. The lock holds a token of its owner, so a worker whose
+    lock expired during a long compute does not delete the lock of the next owner.
+    Waiting is limited to CACHE_LOCK_WAIT per lock owner: the wait restarts when the lock changes hands.
+    A waiter that outlives the wait computes the value itself without the lock.
+    Prefix groups metrics of the cache
+    """
+    with cache_metrics.timer(prefix, "get"):
+        entry = cache.get(cache_name)
+    if entry is not None and not is_early_refresh(entry):
+        cache_metrics.incr(prefix, "hit")
+        return entry["value"]
+    cache_metrics.incr(prefix, "miss" if entry is None else "early_refresh")
+
+    lock_name = f"lock_{cache_name}"
+    token = uuid.uuid4().hex
+    owner = None
+    deadline = time.monotonic() + CACHE_LOCK_WAIT
+    while True:
+        if cache.add(lock_name, token, CACHE_LOCK_TIMEOUT):
+            try:
+                start = time.monotonic()
+                value = compute()
+                delta = time.monotonic() - start
+                cache_metrics.observe_latency(prefix, "compute", delta)
+                if value is not None:
+                    entry = {"value": value, "delta": delta, "expiry": time.time() + timeout}
+                    set_cache_value(cache_name, entry, timeout, prefix)
+                return value
+            finally:
+                if cache.get(lock_name) == token:
+                    cache.delete(lock_name)
+
+        if entry is not None:
+            return entry["value"]
+        while time.monotonic() < deadline:
+            time.sleep(CACHE_LOCK_POLL)
+            values = cache.get_many([cache_name, lock_name])
+            if cache_name in values:
+                return values[cache_name]["value"]
+            if lock_name not in values:
+                cache_metrics.incr(prefix, "lock_released")
+                break
+            if values[lock_name] != owner:
+                owner = values[lock_name]
+                deadline = time.monotonic() + CACHE_LOCK_WAIT
+        else:
+            cache_metrics.incr(prefix, "lock_timeout")
+            return compute()
+
+
+def get_query_params_hash(query_params) -> str:
+    """
+    Return short hash of query params except page window
+    """
+    params = sorted((key, values) for key, values in query_params.lists() if key not in ("limit", "offset"))
+    return hashlib.md5(repr(params).encode()).hexdigest()
+
+
+def get_list_cache_name(namespace: str, user_id: int, query_params, limit: int, offset: int) -> str:
+    """
+    Return key of list page for user. Query params are hashed to keep the key short.
+    Pages contain nested products, so the key also depends on product catalog version
+    """
+    params_hash = get_query_params_hash(query_params)
+    catalog_version = get_cache_version(PRODUCT_CATALOG_VERSION)
+    return get_user_cache_name(namespace, user_id, "list", params_hash, limit, offset, catalog_version)
+
+
+def get_list_cache(cache_name: str, prefix: str) -> Union[dict, None]:
+    """
+    Return serialized list page
+    """
+    with cache_metrics.timer(prefix, "get"):
+        data = cache.get(cache_name)
+    cache_metrics.incr(prefix, "miss" if data is None else "hit")
+    return data
+
+
+def set_list_cache(cache_name: str, data: dict, prefix: str) -> None:
+    """
+    Save serialized list page
+    """
+    set_cache_value(cache_name, data, LIST_CACHE_TIMEOUT, prefix)
+
+
+def get_cache_version(version_name: str) -> Union[str, None]:
+    """
+    Return shared version of data, create it if not exists
+    """
+    version = cache.get(version_name)
+    if version is None:
+        cache.add(version_name, uuid.uuid4().hex, None)
+        version = cache.get(version_name)
+    return version
+
+
+def bump_cache_version(version_name: str) -> None:
+    """
+    Change shared version of data so that all workers reload it
+    """
+    cache.set(version_name, uuid.uuid4().hex, None)
+
+
+class LocalCache:
+    """
+    In-process LRU cache with size bound and TTL
+    """
+
+    def __init__(self, maxsize: int, timeout: float):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            expiry, value = item
+            if expiry < time.monotonic():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.timeout, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self.lock:
+            self.data.pop(key, None)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.data.clear()
+
+
+reference_local_cache = LocalCache(REFERENCE_LOCAL_MAXSIZE, REFERENCE_LOCAL_TIMEOUT)
+reference_local_versions = LocalCache(len(REFERENCE_VERSIONS), REFERENCE_VERSION_CHECK_TIMEOUT)
+
+
+def get_reference_version(table: str) -> Union[str, None]:
+    """
+    Return shared version of reference table. Version is checked in Redis
+    not more often than once in REFERENCE_VERSION_CHECK_TIMEOUT seconds
+    """
+    version = reference_local_versions.get(table)
+    if version is None:
+        version = get_cache_version(REFERENCE_VERSIONS[table])
+        if version is not None:
+            reference_local_versions.set(table, version)
+    return version
+
+
+def bump_reference_version(table: str) -> None:
+    """
+    Change version of reference table so that all workers drop both cache tiers
+    """
+    bump_cache_version(REFERENCE_VERSIONS[table])
+    reference_local_versions.delete(table)
+    cache_metrics.incr(f"reference_{table}", "invalidation")
 
 
-def get_or_set_model_cache(prefix_cache: str, user_id, model: models.Model, **kwargs):
+def get_or_set_reference_cache(table: str, key: str, compute: Callable[[], Any]) -> Any:
     """
-    Return found cache or create
+    Return reference data from in-process cache, then from Redis, or compute it.
+    Keys of both tiers contain version of reference table
     """
-    cache_name = f"{prefix_cache}_{user_id}"
-    get_cache = cache.get(cache_name)
-    if get_cache:
-        return get_cache
+    prefix = f"reference_{table}"
+    version = get_reference_version(table)
+    if version is None:
+        return compute()
+    local_key = (table, version, key)
+    value = reference_local_cache.get(local_key)
+    if value is not None:
+        cache_metrics.incr(prefix, "local_hit")
+        return value
+    cache_name = f"reference_{table}_{version}_{key}"
+    with cache_metrics.timer(prefix, "get"):
+        value = cache.get(cache_name)
+    if value is None:
+        cache_metrics.incr(prefix, "miss")
+        value = compute()
+        set_cache_value(cache_name, value, REFERENCE_CACHE_TIMEOUT, prefix)
     else:
-        queryset = model.objects.filter(**kwargs)
-        cache.set(cache_name, queryset, 60 * 60 * 1)
-        return queryset
+        cache_metrics.incr(prefix, "hit")
+    reference_local_cache.set(local_key, value)
+    return value
@@ -0,0 +1,34 @@
+from collections import defaultdict
+from typing import Callable, Iterable
+
+from bood_app.utils.cache import bump_cache_generation
+
+cache_dependencies = defaultdict(set)
+
+
+def cache_depends_on(namespace: str, *models) -> Callable[[type], type]:
+    """
+    Register models whose changes invalidate user namespace of cached view.
+    Many-to-many relations are registered by their through models
+    """
+
+    def decorator(cls: type) -> type:
+        for model in models:
+            cache_dependencies[model].add(namespace)
+        return cls
+
+    return decorator
+
+
+def get_cache_dependency_models() -> tuple:
+    return tuple(cache_dependencies)
+
+
+def bump_dependent_cache_generations(model, user_ids: Iterable[int]) -> None:
+    """
+    Invalidate all user namespaces depending on model
+    """
+    namespaces = cache_dependencies.get(model, ())
+    for user_id in user_ids:
+        for namespace in namespaces:
+            bump_cache_generation(namespace, user_id)
@@ -0,0 +1,135 @@
+import bisect
+import itertools
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator
+
+from bood_app.utils.cache_serializer import compression_stats
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Histogram:
+    """
+    Histogram with fixed upper bounds, last bucket is +Inf
+    """
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        cumulative = list(itertools.accumulate(self.counts))
+        buckets = {str(bound): count for bound, count in zip(self.buckets, cumulative)}
+        buckets["+Inf"] = cumulative[-1]
+        return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+
+class CacheMetrics:
+    """
+    Counters and histograms of cache usage per key prefix in current process
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        self.counters = defaultdict(int)
+        self.latency = {}
+        self.sizes = {}
+
+    def incr(self, prefix: str, event: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[(prefix, event)] += value
+
+    def observe_latency(self, prefix: str, operation: str, seconds: float) -> None:
+        with self.lock:
+            key = (prefix, operation)
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+            self.latency[key].observe(seconds)
+
+    def observe_size(self, prefix: str, size: int) -> None:
+        """
+        Record size in bytes of value as stored by the cache serializer
+        """
+        with self.lock:
+            if prefix not in self.sizes:
+                self.sizes[prefix] = Histogram(SIZE_BUCKETS)
+            self.sizes[prefix].observe(size)
+
+    @contextmanager
+    def timer(self, prefix: str, operation: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_latency(prefix, operation, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            counters = defaultdict(dict)
+            for (prefix, event), count in self.counters.items():
+                counters[prefix][event] = count
+            latency = defaultdict(dict)
+            for (prefix, operation), histogram in self.latency.items():
+                latency[prefix][operation] = histogram.snapshot()
+            sizes = {prefix: histogram.snapshot() for prefix, histogram in self.sizes.items()}
+        return {
+            "pid": os.getpid(),
+            "counters": dict(counters),
+            "latency": dict(latency),
+            "sizes": sizes,
+            "compression": compression_stats.snapshot(),
+        }
+
+    def render_prometheus(self) -> str:
+        """
+        Return metrics in Prometheus text exposition format
+        """
+        snapshot = self.snapshot()
+        lines = ["# TYPE bood_cache_events_total counter"]
+        for prefix, events in sorted(snapshot["counters"].items()):
+            for event, count in sorted(events.items()):
+                lines.append(f'bood_cache_events_total{{prefix="{prefix}",event="{event}"}} {count}')
+        lines.append("# TYPE bood_cache_latency_seconds histogram")
+        for prefix, operations in sorted(snapshot["latency"].items()):
+            for operation, histogram in sorted(operations.items()):
+                labels = f'prefix="{prefix}",operation="{operation}"'
+                lines.extend(render_prometheus_histogram("bood_cache_latency_seconds", labels, histogram))
+        lines.append("# TYPE bood_cache_payload_bytes histogram")
+        for prefix, histogram in sorted(snapshot["sizes"].items()):
+            lines.extend(render_prometheus_histogram("bood_cache_payload_bytes", f'prefix="{prefix}"', histogram))
+        compression = snapshot["compression"]
+        lines.append("# TYPE bood_cache_serialized_values_total counter")
+        uncompressed = compression["values"] - compression["compressed"]
+        lines.append(f'bood_cache_serialized_values_total{{compressed="false"}} {uncompressed}')
+        lines.append(f'bood_cache_serialized_values_total{{compressed="true"}} {compression["compressed"]}')
+        lines.append("# TYPE bood_cache_serialized_bytes_total counter")
+        lines.append(f'bood_cache_serialized_bytes_total{{stage="raw"}} {compression["raw_bytes"]}')
+        lines.append(f'bood_cache_serialized_bytes_total{{stage="stored"}} {compression["stored_bytes"]}')
+        lines.append("# TYPE bood_cache_compression_ratio gauge")
+        lines.append(f"bood_cache_compression_ratio {compression['ratio']}")
+        return "\n".join(lines) + "\n"
+
+
+def render_prometheus_histogram(name: str, labels: str, histogram: dict) -> list:
+    lines = [f'{name}_bucket{{{labels},le="{bound}"}} {count}' for bound, count in histogram["buckets"].items()]
+    lines.append(f"{name}_sum{{{labels}}} {histogram['sum']}")
+    lines.append(f"{name}_count{{{labels}}} {histogram['count']}")
+    return lines
+
+
+cache_metrics = CacheMetrics()
@@ -0,0 +1,96 @@
+import pickle
+import threading
+import zlib
+from typing import Union
+
+from django.core.cache.backends.redis import RedisSerializer
+
+COMPRESSED_MARKER = b"z"
+
+
+class CompressionStats:
+    """
+    Counters of values written by serializer in current process
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        self.values = 0
+        self.compressed = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+
+    def record(self, raw_size: int, stored_size: int, compressed: bool) -> None:
+        with self.lock:
+            self.values += 1
+            self.compressed += compressed
+            self.raw_bytes += raw_size
+            self.stored_bytes += stored_size
+
+    @property
+    def ratio(self) -> float:
+        """
+        Return raw size divided by stored size, 1.0 if nothing was written
+        """
+        return self.raw_bytes / self.stored_bytes if self.stored_bytes else 1.0
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "values": self.values,
+                "compressed": self.compressed,
+                "raw_bytes": self.raw_bytes,
+                "stored_bytes": self.stored_bytes,
+                "ratio": self.ratio,
+            }
+
+
+compression_stats = CompressionStats()
+_stored = threading.local()
+
+
+def pop_stored_size() -> Union[int, None]:
+    """
+    Return size of the last value written by serializer in current thread and forget it.
+    None if nothing was written, e.g. with a backend that does not use this serializer
+    """
+    size = getattr(_stored, "size", None)
+    _stored.size = None
+    return size
+
+
+class CompressedRedisSerializer(RedisSerializer):
+    """
+    Pickle with the highest protocol, compressed with zlib above min_size.
+    Compressed values are prefixed with marker, pickles always start with b"\x80",
+    so values written by the default serializer are still readable
+    """
+
+    min_size = 1024
+    level = 6
+
+    def dumps(self, obj):
+        if type(obj) is int:
+            return obj
+        data = pickle.dumps(obj, self.protocol)
+        if len(data) >= self.min_size:
+            compressed = COMPRESSED_MARKER + zlib.compress(data, self.level)
+            if len(compressed) < len(data):
+                compression_stats.record(len(data), len(compressed), True)
+                _stored.size = len(compressed)
+                return compressed
+        compression_stats.record(len(data), len(data), False)
+        _stored.size = len(data)
+        return data
+
+    def loads(self, data):
+        try:
+            return int(data)
+        except ValueError:
+            pass
+        if data[:1] == COMPRESSED_MARKER:
+            data = zlib.decompress(data[1:])
+        return pickle.loads(data)
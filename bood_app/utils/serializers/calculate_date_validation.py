@@ -1,5 +1,5 @@
 import datetime
-from typing import Union
+from typing import Union, Tuple
 
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
@@ -17,3 +17,16 @@ def check_dateformat_or_get_current_date(str_date: str) -> Union[datetime.date,
     else:
         date = timezone.now().date()
     return date
+
+
+def check_date_range(str_date_from: str, str_date_to: str, max_days: int = 366) -> Tuple[datetime.date, datetime.date]:
+    """
+    Проверка периода дат.
+    """
+    date_from = check_dateformat_or_get_current_date(str_date_from)
+    date_to = check_dateformat_or_get_current_date(str_date_to)
+    date_from = datetime.date(date_from.year, date_from.month, date_from.day)
+    date_to = datetime.date(date_to.year, date_to.month, date_to.day)
+    if date_from > date_to or (date_to - date_from).days >= max_days:
+        raise ValidationError({"status": 400, "error": "Invalid date range"})
+    return date_from, date_to
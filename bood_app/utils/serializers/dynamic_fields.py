@@ -0,0 +1,81 @@
+from typing import Callable, Dict, Union
+
+from rest_framework import serializers
+
+FIELDS_QUERY_PARAM = "fields"
+EXPAND_QUERY_PARAM = "expand"
+
+
+def get_query_param_set(request, name: str) -> Union[set, None]:
+    """
+    Значения параметра запроса через запятую. None, если параметра нет.
+    """
+    if request is None or name not in request.query_params:
+        return None
+    return {value.strip() for value in request.query_params[name].split(",") if value.strip()}
+
+
+def get_serializer_shape(request) -> tuple:
+    """
+    Запрошенные поля и раскрываемые вложенные объекты.
+    Пустой или отсутствующий fields - все поля, отсутствующий expand - раскрыть все.
+    """
+    return get_query_param_set(request, FIELDS_QUERY_PARAM) or None, get_query_param_set(request, EXPAND_QUERY_PARAM)
+
+
+def get_nested_expand(expand: Union[set, None], name: str) -> Union[set, None]:
+    """
+    Раскрываемые объекты внутри поля name: expand=recipe.product_weight раскрывает продукты рецепта
+    """
+    if expand is None:
+        return None
+    prefix = f"{name}."
+    return {value[len(prefix) :] for value in expand if value.startswith(prefix)}
+
+
+def is_field_wanted(fields: Union[set, None], name: str) -> bool:
+    return fields is None or name in fields
+
+
+def is_field_expanded(expand: Union[set, None], name: str) -> bool:
+    return expand is None or name in expand or any(value.startswith(f"{name}.") for value in expand)
+
+
+class DynamicFieldsMixin:
+    """
+    Сериализатор чтения с параметрами ?fields= и ?expand=.
+    fields оставляет только перечисленные поля верхнего уровня. Если передан expand, раскрываются
+    только перечисленные вложенные объекты, остальные из collapsed_fields выводятся в свернутом виде, обычно id.
+    Вложенный сериализатор получает свою часть expand, заданную через точку.
+    """
+
+    collapsed_fields: Dict[str, Callable[[], serializers.Field]] = {}
+
+    def get_shape(self) -> tuple:
+        shape = getattr(self, "_shape", None)
+        if shape is not None:
+            return shape
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return None, None
+        return get_serializer_shape(self.context.get("request"))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        only, expand = self.get_shape()
+        if only is not None:
+            fields = type(fields)((name, field) for name, field in fields.items() if name in only)
+        if expand is None:
+            return fields
+        for name, collapse in self.collapsed_fields.items():
+            if name not in fields:
+                continue
+            if not is_field_expanded(expand, name):
+                fields[name] = collapse()
+                continue
+            nested = fields[name].child if isinstance(fields[name], serializers.ListSerializer) else fields[name]
+            if isinstance(nested, DynamicFieldsMixin):
+                nested._shape = (None, get_nested_expand(expand, name))
+        return fields
@@ -3,7 +3,26 @@ from bood_app.models import ProductWeight, Recipe
 
 def create_product_weight_instances(product_weight: list, recipe: Recipe) -> None:
     """
-    Создать экземпляры product_weight для рецепта.
+    Создать экземпляры product_weight для рецепта одним запросом.
     """
-    for product_weight in product_weight:
-        ProductWeight.objects.create(recipe=recipe, **product_weight)
+    ProductWeight.objects.bulk_create(ProductWeight(recipe=recipe, **item) for item in product_weight)
+
+
+def update_product_weight_instances(product_weight: list, recipe: Recipe) -> None:
+    """
+    Заменить набор product_weight рецепта, изменяя только отличающиеся строки.
+    Строки сопоставляются по порядку, лишние удаляются, недостающие добавляются одним запросом.
+    """
+    current = list(recipe.product_weight.order_by("id"))
+    changed = []
+    for instance, item in zip(current, product_weight):
+        product_id = item["product"].pk if "product" in item else item["product_id"]
+        if instance.product_id != product_id or instance.weight != item["weight"]:
+            instance.product_id = product_id
+            instance.weight = item["weight"]
+            changed.append(instance)
+    if changed:
+        ProductWeight.objects.bulk_update(changed, ["product", "weight"])
+    if len(current) > len(product_weight):
+        ProductWeight.objects.filter(pk__in=[instance.pk for instance in current[len(product_weight) :]]).delete()
+    create_product_weight_instances(product_weight[len(current) :], recipe)
@@ -0,0 +1,28 @@
+from typing import Callable
+
+from django.http import HttpResponseBase
+from django.utils.cache import get_conditional_response, patch_cache_control
+from rest_framework import status
+from rest_framework.response import Response
+
+from bood_app.utils.cache import get_cache_etag
+from bood_app.utils.cache_metrics import cache_metrics
+
+
+def get_conditional_cached_response(
+    request, cache_name: str, get_response: Callable[[], Response], prefix: str
+) -> HttpResponseBase:
+    """
+    Ответ 304 по If-None-Match без обращения к базе и сериализаторам.
+    ETag выводится из ключа кеша, который меняется вместе с поколением кеша пользователя.
+    """
+    etag = get_cache_etag(cache_name)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        cache_metrics.incr(prefix, "not_modified")
+        return not_modified
+    response = get_response()
+    if response.status_code == status.HTTP_200_OK:
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,114 @@
+import hashlib
+
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from bood_app.utils.cache import (
+    get_list_cache,
+    get_list_cache_name,
+    get_or_set_reference_cache,
+    set_list_cache,
+)
+from bood_app.utils.views.conditional import get_conditional_cached_response
+
+LIST_CACHE_MAX_LIMIT = 100
+
+
+class UserListCacheMixin:
+    """
+    Кеширование сериализованной страницы списка объектов пользователя.
+    Ключ зависит от пользователя, поколения кеша, параметров запроса и окна страницы.
+    Страницы больше LIST_CACHE_MAX_LIMIT не кешируются.
+    Для кешируемых страниц поддерживается условный GET по ETag.
+    """
+
+    cache_namespace = None
+
+    def list(self, request, *args, **kwargs):
+        limit = self.paginator.get_limit(request) if self.paginator else None
+        offset = self.paginator.get_offset(request) if self.paginator else 0
+        if limit is None or limit > LIST_CACHE_MAX_LIMIT:
+            return super().list(request, *args, **kwargs)
+
+        cache_name = get_list_cache_name(self.cache_namespace, request.user.id, request.query_params, limit, offset)
+        return get_conditional_cached_response(
+            request,
+            cache_name,
+            lambda: self.get_cached_list(cache_name, request, *args, **kwargs),
+            self.cache_namespace,
+        )
+
+    def get_cached_list(self, cache_name: str, request, *args, **kwargs) -> Response:
+        data = get_list_cache(cache_name, self.cache_namespace)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        set_list_cache(cache_name, response.data, self.cache_namespace)
+        return response
+
+
+def get_reference_list_key(search: str, limit: int, offset: int) -> str:
+    """
+    Ключ страницы справочника по нормализованному поисковому запросу и окну страницы.
+    Поиск нечувствителен к регистру и порядку слов, поэтому слова приводятся к нижнему регистру и сортируются.
+    """
+    terms = sorted(set(search.replace("\x00", "").replace(",", " ").lower().split()))
+    search_hash = hashlib.md5(" ".join(terms).encode()).hexdigest()
+    return f"list_{search_hash}_{limit}_{offset}"
+
+
+def get_reference_page(serializer_class, queryset, limit: int, offset: int) -> dict:
+    """
+    Страница справочника без ссылок пагинации: ссылки зависят от адреса запроса и строятся при ответе
+    """
+    page = queryset[offset : offset + limit]
+    return {"count": queryset.count(), "results": serializer_class(page, many=True).data}
+
+
+class ReferenceListCacheMixin:
+    """
+    Кеширование страницы справочника в памяти процесса и в Redis, общее для всех пользователей.
+    Аутентификация и права проверяются до обращения к кешу, но в ключ не входят.
+    Кеш сбрасывается при изменении версии справочника.
+    Страницы больше LIST_CACHE_MAX_LIMIT не кешируются.
+    """
+
+    reference_table = None
+
+    def list(self, request, *args, **kwargs):
+        limit = self.paginator.get_limit(request) if self.paginator else None
+        offset = self.paginator.get_offset(request) if self.paginator else 0
+        if limit is None or limit > LIST_CACHE_MAX_LIMIT:
+            return super().list(request, *args, **kwargs)
+
+        search = request.query_params.get(api_settings.SEARCH_PARAM, "") if getattr(self, "search_fields", None) else ""
+        page = get_or_set_reference_cache(
+            self.reference_table,
+            get_reference_list_key(search, limit, offset),
+            lambda: get_reference_page(
+                self.get_serializer_class(), self.filter_queryset(self.get_queryset()), limit, offset
+            ),
+        )
+        self.paginator.request = request
+        self.paginator.limit = limit
+        self.paginator.offset = offset
+        self.paginator.count = page["count"]
+        return self.paginator.get_paginated_response(page["results"])
+
+    @classmethod
+    def warm_reference_cache(cls, pages: int) -> int:
+        """
+        Заполнение кеша первыми страницами справочника без поиска. Возвращает число страниц
+        """
+        queryset = cls.queryset.all()
+        limit = min(cls.pagination_class.default_limit, LIST_CACHE_MAX_LIMIT)
+        for number in range(pages):
+            offset = number * limit
+            page = get_or_set_reference_cache(
+                cls.reference_table,
+                get_reference_list_key("", limit, offset),
+                lambda: get_reference_page(cls.serializer_class, queryset, limit, offset),
+            )
+            if offset + limit >= page["count"]:
+                return number + 1
+        return pages
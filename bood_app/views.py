@@ -1,18 +1,23 @@
-from django.core.cache import cache
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.http import HttpResponse
+from django.utils import timezone
 from rest_framework import viewsets, mixins
+from rest_framework.decorators import action
 from rest_framework.generics import RetrieveAPIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
+from bood_account.models import Person
+
 from .api_docs import (
+    cache_metrics_summary,
+    cache_metrics_prometheus_summary,
     product_list_summary,
     person_card_summary,
     measurement_summary,
     recipe_summary,
     eating_summary,
     calculate_current_retrieve_summary,
+    calculate_current_range_retrieve_summary,
     calculate_standard_retrieve_summary,
     female_type_summary,
     recommendation_include_summary,
@@ -23,9 +28,23 @@ from .api_docs import (
 )
 from .documents import ProductDocument, ElasticFind
 from .filters import TitleSearchFilter, DateSearchFilter
-from .models import Product, PersonCard, Eating, Measurement, Recipe, FemaleType, ProductCategory, FAQ
+from .pagination import TimelinePagination
+from .models import (
+    Product,
+    PersonCard,
+    Eating,
+    Measurement,
+    Recipe,
+    FemaleType,
+    ProductCategory,
+    FAQ,
+    ProductWeight,
+    Water,
+    DailyIntake,
+)
 from .permissions import IsOwnerOrAdminPersonCard, IsOwnerOrAdmin
 from .serializers import (
+    BulkEatingSerializer,
     ProductSerializer,
     PostPersonCardSerializer,
     GetPersonCardSerializer,
@@ -35,6 +54,7 @@ from .serializers import (
     PostEatingSerializer,
     GetEatingSerializer,
     CalculateSerializer,
+    CalculateRangeSerializer,
     RecommendationIncludeSerializer,
     RecommendationExcludeSerializer,
     FemaleTypeSerializer,
@@ -42,23 +62,32 @@ from .serializers import (
     FAQSerializer,
     ProductSearchSerializer,
 )
-from .utils.cache import get_or_set_model_cache, get_calculate_standard_cache, get_calculate_current_cache
+from .utils.cache import (
+    CALCULATE_CACHE_TIMEOUT,
+    get_calculate_cache_name,
+    get_calculate_cache_timeout,
+    get_recommendation_cache_name,
+    get_or_set_single_flight,
+)
+from bood_app.utils.cache_dependencies import cache_depends_on
+from bood_app.utils.cache_metrics import cache_metrics
+from bood_app.utils.serializers.calculate_date_validation import check_dateformat_or_get_current_date
+from bood_app.utils.serializers.dynamic_fields import get_serializer_shape
+from bood_app.utils.views.conditional import get_conditional_cached_response
+from bood_app.utils.views.list_cache import ReferenceListCacheMixin, UserListCacheMixin
 from bood_app.utils.views.view_validation import view_validation, calculate_view_validation
 
 
 @product_list_summary
-class ProductViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class ProductViewSet(ReferenceListCacheMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
     queryset = Product.objects.all().order_by("id")
     serializer_class = ProductSerializer
+    reference_table = "product"
     permission_classes = [IsAuthenticated]
     http_method_names = ["get", "head", "options"]
     filter_backends = [TitleSearchFilter]
     search_fields = ["title"]
 
-    @method_decorator(cache_page(60 * 60 * 1))
-    def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
-
 
 class ProductSearch(RetrieveAPIView):
     permission_classes = [IsAuthenticated]
@@ -75,47 +104,48 @@ class ProductSearch(RetrieveAPIView):
 
 
 @categoryrecommendation_list_summary
-class ProductCategoryViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class ProductCategoryViewSet(ReferenceListCacheMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
     queryset = ProductCategory.objects.all().order_by("id")
     serializer_class = ProductCategorySerializer
+    reference_table = "product_category"
     permission_classes = [IsAuthenticated]
     http_method_names = ["get", "head", "options"]
     filter_backends = [TitleSearchFilter]
     search_fields = ["title"]
 
-    @method_decorator(cache_page(60 * 60 * 1))
-    def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
-
 
 @faq_list_summary
-class FAQViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class FAQViewSet(ReferenceListCacheMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
     queryset = FAQ.objects.all().order_by("id")
     serializer_class = FAQSerializer
+    reference_table = "faq"
     permission_classes = [IsAuthenticated]
     http_method_names = ["get", "head", "options"]
     filter_backends = [TitleSearchFilter]
     search_fields = ["question"]
 
-    @method_decorator(cache_page(60 * 60 * 1))
-    def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
-
 
 @female_type_summary
-class FemaleTypeViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+class FemaleTypeViewSet(ReferenceListCacheMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
     queryset = FemaleType.objects.all().order_by("id")
     serializer_class = FemaleTypeSerializer
+    reference_table = "female_type"
     permission_classes = [IsAuthenticated]
     http_method_names = ["get", "head", "options"]
 
-    @method_decorator(cache_page(60 * 60 * 1))
-    def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
-
 
 @person_card_summary
+@cache_depends_on(
+    "person_card",
+    Person,
+    PersonCard,
+    Measurement,
+    PersonCard.femaletype.through,
+    PersonCard.exclude_products.through,
+    PersonCard.exclude_category.through,
+)
 class PersonCardView(
+    UserListCacheMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.UpdateModelMixin,
@@ -125,12 +155,16 @@ class PersonCardView(
     queryset = PersonCard.objects.all()
     serializer_class = GetPersonCardSerializer
     http_method_names = ["get", "post", "patch", "delete", "head", "options"]
+    cache_namespace = "person_card"
     permission_classes = [IsAuthenticated, IsOwnerOrAdminPersonCard]
 
     def get_queryset(self):
         if self.request.user:
             user_id = self.request.user.id
-            return get_or_set_model_cache("person_card", user_id, PersonCard, person=user_id)
+            queryset = PersonCard.objects.filter(person=user_id)
+            if self.action in ("list", "retrieve"):
+                queryset = GetPersonCardSerializer.setup_eager_loading(queryset, *get_serializer_shape(self.request))
+            return queryset
 
     def get_serializer_class(self):
         if self.request.method == "POST" or self.request.method == "PATCH":
@@ -149,18 +183,24 @@ class PersonCardView(
 
 
 @eating_summary
-class EatingViewSet(viewsets.ModelViewSet):
+@cache_depends_on("eating", Eating, ProductWeight, Water, Recipe)
+class EatingViewSet(UserListCacheMixin, viewsets.ModelViewSet):
     queryset = Eating.objects.all()
     serializer_class = GetEatingSerializer
     http_method_names = ["get", "post", "patch", "delete", "head", "options"]
+    cache_namespace = "eating"
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin]
+    pagination_class = TimelinePagination
     filter_backends = [DateSearchFilter]
     search_fields = ["datetime_add"]
 
     def get_queryset(self):
         if self.request.user:
             user_id = self.request.user.id
-            return get_or_set_model_cache("eating", user_id, Eating, person_card__person=user_id)
+            queryset = Eating.objects.filter(person_card__person=user_id)
+            if self.action in ("list", "retrieve"):
+                queryset = GetEatingSerializer.setup_eager_loading(queryset, *get_serializer_shape(self.request))
+            return queryset
 
     def get_serializer_class(self):
         if self.request.method == "POST" or self.request.method == "PATCH":
@@ -172,59 +212,98 @@ class EatingViewSet(viewsets.ModelViewSet):
         serializer = PostEatingSerializer(data=request.data, context={"user_id": user_id})
         return view_validation(serializer)
 
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request, *args, **kwargs):
+        user_id = request.user.id
+        serializer = BulkEatingSerializer(data=request.data, many=True, context={"user_id": user_id})
+        return view_validation(serializer)
+
     def partial_update(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = PostEatingSerializer(instance, data=request.data, partial=True)
         return view_validation(serializer)
 
 
+@cache_depends_on("calculate", PersonCard, Measurement, Eating, ProductWeight, DailyIntake)
 class StandardValuesView(RetrieveAPIView):
     permission_classes = [IsAuthenticated]
 
     @calculate_standard_retrieve_summary
     def get(self, request, *args, **kwargs) -> Response:
         user_id = request.user.id
-        calculate_cache = get_calculate_standard_cache(user_id)
-        if calculate_cache:
-            return calculate_view_validation(calculate_cache)
-        else:
-            date = request.query_params.get("date", None)
-            serializer = CalculateSerializer(
-                data=request.data, context={"date": date, "user_id": user_id, "calculate_type": "standard"}
+        str_date = request.query_params.get("date", None)
+        date = check_dateformat_or_get_current_date(str_date)
+        cache_name = get_calculate_cache_name("standard", user_id, date)
+
+        def get_response() -> Response:
+            instance = get_or_set_single_flight(
+                cache_name,
+                lambda: CalculateSerializer(
+                    context={"date": str_date, "user_id": user_id, "calculate_type": "standard"}
+                ).instance,
+                get_calculate_cache_timeout(date),
+                "calculate_standard",
             )
-            cache.set(f"calculate_standard_{user_id}", serializer, 60 * 60 * 1)
+            serializer = CalculateSerializer(data=request.data, instance=instance)
             return calculate_view_validation(serializer)
 
+        return get_conditional_cached_response(request, cache_name, get_response, "calculate_standard")
+
 
+@cache_depends_on("calculate", PersonCard, Measurement, Eating, ProductWeight, DailyIntake)
 class CurrentValuesView(RetrieveAPIView):
     permission_classes = [IsAuthenticated]
 
     @calculate_current_retrieve_summary
     def get(self, request, *args, **kwargs) -> Response:
         user_id = request.user.id
-        calculate_cache = get_calculate_current_cache(user_id)
-        if calculate_cache:
-            return calculate_view_validation(calculate_cache)
-        else:
-            date = request.query_params.get("date", None)
-            serializer = CalculateSerializer(
-                data=request.data, context={"date": date, "user_id": user_id, "calculate_type": "current"}
+        str_date = request.query_params.get("date", None)
+        date = check_dateformat_or_get_current_date(str_date)
+        cache_name = get_calculate_cache_name("current", user_id, date)
+
+        def get_response() -> Response:
+            instance = get_or_set_single_flight(
+                cache_name,
+                lambda: CalculateSerializer(
+                    context={"date": str_date, "user_id": user_id, "calculate_type": "current"}
+                ).instance,
+                get_calculate_cache_timeout(date),
+                "calculate_current",
             )
-            cache.set(f"calculate_current_{user_id}", serializer, 60 * 60 * 1)
+            serializer = CalculateSerializer(data=request.data, instance=instance)
             return calculate_view_validation(serializer)
 
+        return get_conditional_cached_response(request, cache_name, get_response, "calculate_current")
+
+
+class CurrentRangeValuesView(RetrieveAPIView):
+    permission_classes = [IsAuthenticated]
+
+    @calculate_current_range_retrieve_summary
+    def get(self, request, *args, **kwargs) -> Response:
+        user_id = request.user.id
+        date_from = request.query_params.get("from", None)
+        date_to = request.query_params.get("to", None)
+        serializer = CalculateRangeSerializer(
+            data=request.data, context={"date_from": date_from, "date_to": date_to, "user_id": user_id}
+        )
+        return calculate_view_validation(serializer)
+
 
 @measurement_summary
-class MeasurementViewSet(viewsets.ModelViewSet):
+@cache_depends_on("measurement", Measurement)
+class MeasurementViewSet(UserListCacheMixin, viewsets.ModelViewSet):
     queryset = Measurement.objects.all()
     serializer_class = MeasurementSerializer
     http_method_names = ["get", "post", "patch", "delete", "head", "options"]
+    cache_namespace = "measurement"
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin]
+    pagination_class = TimelinePagination
 
     def get_queryset(self):
         if self.request.user:
             user_id = self.request.user.id
-            return get_or_set_model_cache("measurement", user_id, Measurement, person_card__person_id=user_id)
+            return Measurement.objects.filter(person_card__person_id=user_id)
 
     def create(self, request, *args, **kwargs):
         user_id = request.user.id
@@ -238,17 +317,22 @@ class MeasurementViewSet(viewsets.ModelViewSet):
 
 
 @recipe_summary
-class RecipeViewSet(viewsets.ModelViewSet):
+@cache_depends_on("recipe", Recipe, ProductWeight)
+class RecipeViewSet(UserListCacheMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = GetRecipeSerializer
     http_method_names = ["get", "post", "patch", "delete", "head", "options"]
+    cache_namespace = "recipe"
     permission_classes = [IsAuthenticated, IsOwnerOrAdmin]
     filter_backends = [TitleSearchFilter]
     search_fields = ["title"]
 
     def get_queryset(self):
         user_id = self.request.user.id
-        return get_or_set_model_cache("recipe", user_id, Recipe, person_card__person=user_id, is_active=True)
+        queryset = Recipe.objects.filter(person_card__person=user_id, is_active=True)
+        if self.action in ("list", "retrieve"):
+            queryset = GetRecipeSerializer.setup_eager_loading(queryset, *get_serializer_shape(self.request))
+        return queryset
 
     def get_serializer_class(self):
         if self.request.method == "POST" or self.request.method == "PATCH":
@@ -266,21 +350,75 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return view_validation(serializer)
 
 
+@cache_depends_on(
+    "recommendation",
+    PersonCard,
+    Measurement,
+    Eating,
+    ProductWeight,
+    DailyIntake,
+    PersonCard.exclude_products.through,
+    PersonCard.exclude_category.through,
+)
 class RecommendationIncludeView(RetrieveAPIView):
     permission_classes = [IsAuthenticated]
 
     @recommendation_include_summary
     def get(self, request, *args, **kwargs) -> Response:
         user_id = request.user.id
-        serializer = RecommendationIncludeSerializer(data=request.data, context={"user_id": user_id})
+        date = timezone.now().date()
+        cache_name = get_recommendation_cache_name("include", user_id, date)
+        product_ids = get_or_set_single_flight(
+            cache_name,
+            lambda: RecommendationIncludeSerializer(context={"user_id": user_id}).instance,
+            CALCULATE_CACHE_TIMEOUT,
+            "recommendation_include",
+        )
+        serializer = RecommendationIncludeSerializer(data=request.data, instance=product_ids)
         return calculate_view_validation(serializer)
 
 
+@cache_depends_on(
+    "recommendation",
+    PersonCard,
+    Measurement,
+    Eating,
+    ProductWeight,
+    DailyIntake,
+    PersonCard.exclude_products.through,
+    PersonCard.exclude_category.through,
+)
 class RecommendationExcludeView(RetrieveAPIView):
     permission_classes = [IsAuthenticated]
 
     @recommendation_exclude_summary
     def get(self, request, *args, **kwargs) -> Response:
         user_id = request.user.id
-        serializer = RecommendationExcludeSerializer(data=request.data, context={"user_id": user_id})
+        date = timezone.now().date()
+        cache_name = get_recommendation_cache_name("exclude", user_id, date)
+        product_ids = get_or_set_single_flight(
+            cache_name,
+            lambda: RecommendationExcludeSerializer(context={"user_id": user_id}).instance,
+            CALCULATE_CACHE_TIMEOUT,
+            "recommendation_exclude",
+        )
+        serializer = RecommendationExcludeSerializer(data=request.data, instance=product_ids)
         return calculate_view_validation(serializer)
+
+
+class CacheMetricsView(RetrieveAPIView):
+    permission_classes = [IsAdminUser]
+    http_method_names = ["get", "head", "options"]
+
+    @cache_metrics_summary
+    def get(self, request, *args, **kwargs) -> Response:
+        return Response(cache_metrics.snapshot())
+
+
+class CacheMetricsPrometheusView(RetrieveAPIView):
+    permission_classes = [IsAdminUser]
+    http_method_names = ["get", "head", "options"]
+
+    @cache_metrics_prometheus_summary
+    def get(self, request, *args, **kwargs) -> HttpResponse:
+        return HttpResponse(cache_metrics.render_prometheus(), content_type="text/plain; version=0.0.4")